@@ -1,4 +1,6 @@
 import requests
+import hashlib
+import inspect
 import json
 import os
 import re
@@ -6,42 +8,75 @@ from urllib.parse import urlparse
 from collections import defaultdict
 from datetime import datetime
 import pytz
-import concurrent.futures
 import threading
 import logging
 from bs4 import BeautifulSoup
+from extinf import format_extinf, parse_extinf
+from fetch_stage import fetch_all
+from http_pool import HostPool
+from link_cache import LinkStatusCache
+from link_checker import AsyncLinkChecker
+from manifest import load_sources
+from parse_cache import ParseCache
+from source_cache import SourceCache
+from stream_probe import ALIVE
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class M3UCollector:
-    def __init__(self, country="Private", base_dir="Movies", check_links=True):
+    def __init__(self, country="Private", base_dir="Movies", check_links=True, max_concurrency=8, http_pool=None, source_cache=None, parse_cache=None, link_cache=None, link_checker=None, probe_mode="ranged", deep_verdicts=(ALIVE,)):
         self.channels = defaultdict(list)
         self.default_logo = "https://buddytv.netlify.app/img/no-logo.png"
         self.seen_urls = set()
-        self.url_status_cache = {}
         self.output_dir = os.path.join(base_dir, country)
         self.lock = threading.Lock()
+        self.max_concurrency = max_concurrency  # Parallel source downloads
+        self.http = http_pool or HostPool()  # Keep-alive connections shared by fetches and link checks
+        self.owns_http = http_pool is None  # A shared pool is reported by whoever created it
+        self.link_cache = link_cache or LinkStatusCache()  # Check results kept across runs
+        self.link_checker = link_checker or AsyncLinkChecker()  # Probes many links at once on one event loop
+        self.source_cache = source_cache or SourceCache()  # Bodies and validators from previous runs
+        self.parse_cache = parse_cache or ParseCache()  # Parsed rows keyed by body hash
+        # Cached records are only valid for this exact parser and its defaults
+        self.parser_id = hashlib.sha1((inspect.getsource(M3UCollector.parse_lines) + inspect.getsource(inspect.getmodule(parse_extinf)) + self.default_logo).encode('utf-8')).hexdigest()
         self.check_links = check_links  # Toggle link checking
+        self.probe_mode = probe_mode  # "status", "ranged" or "deep" (see AsyncLinkChecker)
+        self.deep_verdicts = deep_verdicts  # Deep probe verdicts that keep a link
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def fetch_content(self, url):
-        """Fetch content (M3U or HTML) with streaming."""
+    def fetch_content(self, url, conditional=True):
+        """Fetch content (M3U or HTML), streaming the body to the source cache instead of memory."""
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+        if conditional:
+            headers.update(self.source_cache.request_headers(url))
         
+        body = self.source_cache.fresh_body(url)
+        if body is not None:
+            logging.info(f"Already fetched {url} in this run, reusing {body.lines} lines")
+            return body
         try:
-            with requests.get(url, stream=True, headers=headers, timeout=10) as response:
+            with self.http.get(url, stream=True, headers=headers, timeout=10) as response:
+                if response.status_code == 304:
+                    body = self.source_cache.revalidated(url)
+                    if body is not None:
+                        logging.info(f"Not modified, using cached {body.lines} lines for {url}")
+                        return body
+                    if conditional:
+                        # The cached copy went away after the request was sent
+                        logging.warning(f"Not modified but no cached copy of {url}, fetching it again")
+                        response.close()
+                        return self.fetch_content(url, conditional=False)
                 response.raise_for_status()
-                lines = [line.decode('utf-8', errors='ignore') if isinstance(line, bytes) else line for line in response.iter_lines()]
-                content = '\n'.join(lines)
-                if not lines:
+                body = self.source_cache.spool(url, response)
+                if not body.size:
                     logging.warning(f"No content fetched from {url}")
                 else:
-                    logging.info(f"Fetched {len(lines)} lines from {url}")
-                return content, lines
+                    logging.info(f"Fetched {body.lines} lines from {url}")
+                return body
         except requests.RequestException as e:
             logging.error(f"Failed to fetch {url}: {str(e)}")
-            return None, []
+            return None
 
     def extract_stream_urls_from_html(self, html_content, base_url):
         """Extract streaming URLs from HTML."""
@@ -68,79 +103,63 @@ class M3UCollector:
         return list(stream_urls)
 
     def check_link_active(self, url, timeout=2):
-        """Check if a link is active, optimized for speed."""
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        
-        with self.lock:
-            if url in self.url_status_cache:
-                return self.url_status_cache[url]
-        
-        # Try original URL
-        try:
-            response = requests.head(url, timeout=timeout, headers=headers, allow_redirects=True)
-            if response.status_code < 400:
-                logging.info(f"Checked {url}: Active (HEAD)")
-                with self.lock:
-                    self.url_status_cache[url] = (True, url)
-                return True, url
-        except requests.RequestException:
-            # Only try GET if HEAD fails, skip alternate protocol for speed
-            try:
-                with requests.get(url, stream=True, timeout=timeout, headers=headers) as r:
-                    if r.status_code < 400:
-                        logging.info(f"Checked {url}: Active (GET)")
-                        with self.lock:
-                            self.url_status_cache[url] = (True, url)
-                        return True, url
-            except requests.RequestException as e:
-                logging.warning(f"Link check failed for {url}: {e}")
-                # Try alternate protocol only if not a timeout
-                if not isinstance(e, requests.Timeout):
-                    alt_url = url.replace('http://', 'https://') if url.startswith('http://') else url.replace('https://', 'http://')
-                    try:
-                        response = requests.head(alt_url, timeout=timeout, headers=headers, allow_redirects=True)
-                        if response.status_code < 400:
-                            logging.info(f"Checked {alt_url}: Active (HEAD, switched protocol)")
-                            with self.lock:
-                                self.url_status_cache[url] = (True, alt_url)
-                            return True, alt_url
-                    except requests.RequestException:
-                        pass
-                with self.lock:
-                    self.url_status_cache[url] = (False, url)
-                return False, url
+        """Return (is_active, working_url), probing only if no fresh result is cached."""
+        return self.check_links_active([url], timeout)[url]
 
-    def parse_and_store(self, lines, source_url):
-        """Parse M3U lines and store channels."""
-        current_channel = {}
+    def check_links_active(self, urls, timeout=2):
+        """Return {url: (is_active, working_url)}, probing only urls without a fresh cached result."""
+        results = {}
+        to_probe = []
+        for url in urls:
+            cached = self.link_cache.get(url)
+            if cached is None:
+                to_probe.append(url)
+            else:
+                results[url] = cached
+        for url, (is_active, working_url) in self.link_checker.check_all(to_probe, timeout, swap_protocol=True, mode=self.probe_mode, deep_verdicts=self.deep_verdicts).items():
+            if is_active is not None:  # Deferred by an open circuit, nothing to remember
+                self.link_cache.put(url, is_active, working_url)
+            results[url] = (is_active, working_url)
+        return results
+
+    def parse_and_store(self, body, source_url):
+        """Stream channel records from a fetched body into the store, deduplicating by URL.
+
+        Lines, records and cached rows are all consumed one at a time, so the
+        only thing that grows with the playlist is the set of unique channels.
+        """
+        if body is None:
+            logging.info(f"Parsed 0 channels from {source_url}")
+            return
+        rows = self.parse_cache.get(body.sha256, self.parser_id)
+        if rows is not None:
+            logging.info(f"Body unchanged, using cached channel records for {source_url}")
+        else:
+            rows = self.parse_cache.record(body.sha256, self.parser_id, self.parse_lines(body.iter_lines()))
+        
         channel_count = 0
+        for name, logo, group, url in rows:
+            with self.lock:
+                if url not in self.seen_urls:
+                    self.seen_urls.add(url)
+                    self.channels[group].append({'name': name, 'logo': logo, 'group': group, 'source': source_url, 'url': url})
+                    channel_count += 1
+        logging.info(f"Parsed {channel_count} channels from {source_url}")
+
+    def parse_lines(self, lines):
+        """Yield (name, logo, group, url) for each M3U entry, duplicates included."""
+        current_channel = None
         for line in lines:
             line = line.strip()
             if line.startswith('#EXTINF:'):
-                match = re.search(r'tvg-logo="([^"]*)"', line)
-                logo = match.group(1) if match and match.group(1) else self.default_logo
-                
-                match = re.search(r'group-title="([^"]*)"', line)
-                group = match.group(1) if match else "Movies"
-                
-                match = re.search(r',(.+)$', line)
-                name = match.group(1).strip() if match else "Unnamed Movie"
-                
-                current_channel = {
-                    'name': name,
-                    'logo': logo,
-                    'group': group,
-                    'source': source_url
-                }
+                info = parse_extinf(line)
+                logo = info.attrs.get('tvg-logo') or self.default_logo
+                group = info.attrs.get('group-title', "Movies")
+                name = info.name or "Unnamed Movie"
+                current_channel = (name, logo, group)
             elif line.startswith('http') and current_channel:
-                with self.lock:
-                    if line not in self.seen_urls:
-                        self.seen_urls.add(line)
-                        current_channel['url'] = line
-                        self.channels[current_channel['group']].append(current_channel)
-                        channel_count += 1
-                current_channel = {}
-        logging.info(f"Parsed {channel_count} channels from {source_url}")
+                yield current_channel + (line,)
+                current_channel = None
 
     def filter_active_channels(self):
         """Filter out inactive channels, skippable for speed."""
@@ -150,50 +169,52 @@ class M3UCollector:
         
         active_channels = defaultdict(list)
         all_channels = [(group, ch) for group, chans in self.channels.items() for ch in chans]
-        url_set = set()
         
         logging.info(f"Total channels to check: {len(all_channels)}")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:  # Even fewer workers
-            future_to_channel = {
-                executor.submit(self.check_link_active, ch['url']): (group, ch)
-                for group, ch in all_channels if ch['url'] not in url_set and not url_set.add(ch['url'])
-            }
-            for future in concurrent.futures.as_completed(future_to_channel):
-                group, channel = future_to_channel[future]
-                try:
-                    is_active, updated_url = future.result()
-                    if is_active:
-                        channel['url'] = updated_url
-                        active_channels[group].append(channel)
-                except Exception as e:
-                    logging.error(f"Error checking {channel['url']}: {e}")
+        statuses = self.check_links_active(dict.fromkeys(ch['url'] for _, ch in all_channels))
+        for group, channel in all_channels:
+            is_active, updated_url = statuses[channel['url']]
+            if is_active is None:  # Host circuit open, keep the channel unchecked until the next run
+                active_channels[group].append(channel)
+            elif is_active:
+                channel['url'] = updated_url
+                active_channels[group].append(channel)
 
+        self.link_cache.flush()
         self.channels = active_channels
         logging.info(f"Active channels after filtering: {sum(len(ch) for ch in active_channels.values())}")
 
     def process_sources(self, source_urls):
-        """Process sources sequentially for better control."""
+        """Fetch sources concurrently, then parse them in order."""
         self.channels.clear()
         self.seen_urls.clear()
-        self.url_status_cache.clear()
         
+        # Download concurrently, parse in source order so the first source wins duplicates
         all_m3u_urls = set()
-        for url in source_urls:
-            html_content, lines = self.fetch_content(url)
+        for url, body in zip(source_urls, fetch_all(self.fetch_content, source_urls, self.max_concurrency)):
             if url.endswith('.html'):
-                m3u_urls = self.extract_stream_urls_from_html(html_content, url)
+                m3u_urls = self.extract_stream_urls_from_html(body.text() if body else None, url)
                 all_m3u_urls.update(m3u_urls)
             else:
-                self.parse_and_store(lines, url)
+                self.parse_and_store(body, url)
         
-        for m3u_url in all_m3u_urls:
-            _, lines = self.fetch_content(m3u_url)
-            self.parse_and_store(lines, m3u_url)
+        all_m3u_urls = list(all_m3u_urls)
+        for m3u_url, body in zip(all_m3u_urls, fetch_all(self.fetch_content, all_m3u_urls, self.max_concurrency)):
+            self.parse_and_store(body, m3u_url)
         
         if self.channels:
             self.filter_active_channels()
         else:
             logging.warning("No channels parsed from sources")
+        if self.owns_http:
+            self.http.log_stats()
+
+    def stream_entries(self):
+        """Yield (extinf, url, info) for each channel as export_m3u writes it, for handing to a stream checker."""
+        for group, channels in self.channels.items():
+            for channel in channels:
+                extinf, info = format_extinf(channel["name"], {"tvg-logo": channel["logo"], "group-title": group})
+                yield extinf, channel["url"], info
 
     def export_m3u(self, filename="Movies.m3u"):
         filepath = os.path.join(self.output_dir, filename)
@@ -254,17 +275,12 @@ class M3UCollector:
         logging.info(f"Exported custom format to {filepath}")
         return filepath
 
-def main():
-    # Specific M3U sources (12 sources)
-    source_urls = [
-        "https://adultiptv.net/chs.m3u",
-        "https://raw.githubusercontent.com/3thAn9u/yang-m3u/refs/heads/main/A.m3u",
-        "https://raw.githubusercontent.com/denisskashin/iptv/refs/heads/main/xxx.m3u",
-        "https://raw.githubusercontent.com/kupjta/iptv/refs/heads/main/18plus.m3u",
-    ]
+def main(**shared):
+    # Sources are listed in sources.json
+    source_urls = load_sources("Movies-Private")
 
     # Set check_links=False for super speed, True for accuracy
-    collector = M3UCollector(country="Private", check_links=False)
+    collector = M3UCollector(country="Private", check_links=False, **shared)
     collector.process_sources(source_urls)
     
     # Export files
@@ -277,6 +293,7 @@ def main():
     mumbai_time = datetime.now(pytz.timezone('Asia/Kolkata'))
     logging.info(f"[{mumbai_time}] Collected {total_channels} unique movies for Private")
     logging.info(f"Groups found: {len(collector.channels)}")
+    return collector
 
 if __name__ == "__main__":
     main()
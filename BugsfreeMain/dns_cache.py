@@ -0,0 +1,45 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "dns.sqlite")
+NEGATIVE_TTL = 12 * 3600  # Hosts that did not resolve are rejected without a lookup for this long
+
+
+class NegativeDnsCache:
+    """Hostnames that failed to resolve (NXDOMAIN, no address), kept across runs."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=NEGATIVE_TTL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS unresolvable (host TEXT PRIMARY KEY, error TEXT NOT NULL, failed_at REAL NOT NULL)"
+            )
+            self.conn.execute("DELETE FROM unresolvable WHERE failed_at < ?", (time.time() - ttl,))
+            self.dead = {host: error for host, error in self.conn.execute("SELECT host, error FROM unresolvable")}
+        if self.dead:
+            logging.info(f"Loaded {len(self.dead)} unresolvable hosts from {path}")
+
+    def error(self, host):
+        """The cached resolution error for host, or None if it is not known to be dead."""
+        return self.dead.get(host)
+
+    def mark_dead(self, host, error):
+        with self.lock:
+            self.dead[host] = error
+            self.pending.append((host, error, time.time()))
+
+    def save(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO unresolvable (host, error, failed_at) VALUES (?, ?, ?)", rows
+            )
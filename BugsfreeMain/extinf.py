@@ -0,0 +1,35 @@
+import re
+from collections import namedtuple
+
+# Duration, the attribute section up to the first comma outside quotes, then the display name
+_EXTINF = re.compile(r'#EXTINF:\s*(-?\d+(?:\.\d+)?)?([^,"]*(?:"[^"]*"[^,"]*)*),(.*)')
+_ATTR = re.compile(r'([\w-]+)="([^"]*)"')
+
+ExtInf = namedtuple("ExtInf", "duration attrs name attrs_end")
+ExtInf.__doc__ = """Tokenized #EXTINF line.
+
+duration is the raw duration text (None if absent), attrs maps each
+key="value" attribute to its first value, name is the stripped display name
+and attrs_end is the offset of the comma before the name (or the line length).
+"""
+
+
+def parse_extinf(line):
+    """Tokenize an #EXTINF line in a single scan."""
+    match = _EXTINF.match(line)
+    if match:
+        head, end = match.group(2), match.end(2)
+        # Reversed so the first occurrence of a repeated key wins, as with re.search
+        return ExtInf(match.group(1), dict(_ATTR.findall(head)[::-1]), match.group(3).strip(), end)
+
+    # No comma, or an unbalanced quote: fall back to the first comma
+    end = line.find(",")
+    if end < 0:
+        end = len(line)
+    return ExtInf(None, dict(_ATTR.findall(line, 0, end)[::-1]), line[end + 1:].strip(), end)
+
+
+def format_extinf(name, attrs, duration="-1"):
+    """Build an #EXTINF line from its parts, returned with its ExtInf so it never needs parsing back."""
+    head = f"#EXTINF:{duration}" + "".join(f' {key}="{value}"' for key, value in attrs.items())
+    return f"{head},{name}", ExtInf(duration, dict(attrs), name.strip(), len(head))
@@ -0,0 +1,89 @@
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "latency.sqlite")
+BUCKETS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0]  # Upper bounds in seconds
+PERCENTILE = 0.95
+HEADROOM = 2.0  # Timeout is this multiple of the percentile latency
+MIN_SAMPLES = 10  # Below this the caller's default timeout is used
+MAX_SAMPLES = 1000  # Counts are halved past this so old runs fade out
+FLOOR = 1.0
+CEILING = 10.0
+MAX_AGE = 30 * 24 * 3600
+
+
+class LatencyHistograms:
+    """Per-host response latency histograms, persisted in SQLite between runs.
+
+    A host's timeout is its PERCENTILE latency times HEADROOM, clamped to
+    [FLOOR, CEILING], once it has at least MIN_SAMPLES requests. A request
+    that timed out is a censored sample: all that is known is that it took
+    longer than its timeout.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, percentile=PERCENTILE, floor=FLOOR, ceiling=CEILING):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.percentile = percentile
+        self.floor = floor
+        self.ceiling = ceiling
+        self.lock = threading.Lock()
+        self.changed = set()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS latency (host TEXT PRIMARY KEY, counts TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self.conn.execute("DELETE FROM latency WHERE updated_at < ?", (time.time() - MAX_AGE,))
+            rows = self.conn.execute("SELECT host, counts FROM latency").fetchall()
+        self.histograms = {}
+        for host, counts in rows:
+            counts = json.loads(counts)
+            if len(counts) == len(BUCKETS) + 1:  # Rows from a different bucket layout are dropped
+                self.histograms[host] = counts
+
+    def record(self, host, seconds):
+        self._add(host, bisect.bisect_left(BUCKETS, seconds))
+
+    def record_timeout(self, host, timeout):
+        """Record a request to host that gave up after timeout seconds, in the first bucket above it."""
+        self._add(host, bisect.bisect_right(BUCKETS, timeout))
+
+    def _add(self, host, bucket):
+        with self.lock:
+            counts = self.histograms.setdefault(host, [0] * (len(BUCKETS) + 1))
+            counts[bucket] += 1
+            if sum(counts) > MAX_SAMPLES:
+                counts[:] = [count // 2 for count in counts]
+            self.changed.add(host)
+
+    def timeout(self, host, default):
+        """Adaptive timeout for host, or default if too little is known about it."""
+        with self.lock:
+            counts = self.histograms.get(host)
+            total = sum(counts) if counts else 0
+            if total < MIN_SAMPLES:
+                return default
+            target = self.percentile * total
+            seen = 0
+            for bound, count in zip(BUCKETS + [self.ceiling], counts):
+                seen += count
+                if seen >= target:
+                    break
+        return min(max(bound * HEADROOM, self.floor), self.ceiling)
+
+    def save(self):
+        with self.lock:
+            rows = [(host, json.dumps(self.histograms[host]), time.time()) for host in self.changed]
+            self.changed.clear()
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO latency (host, counts, updated_at) VALUES (?, ?, ?)", rows
+            )
+        logging.info(f"Saved latency histograms for {len(rows)} hosts")
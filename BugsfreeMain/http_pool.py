@@ -0,0 +1,97 @@
+import logging
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+from urllib3.util.retry import Retry
+
+
+class _CountingPoolManager(PoolManager):
+    """PoolManager that reports every TCP connect made for a host."""
+
+    def __init__(self, on_new_connection, **kwargs):
+        self.on_new_connection = on_new_connection
+        super().__init__(**kwargs)
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        new_conn = pool._new_conn
+
+        def counted_new_conn():
+            # urllib3 reconnects dropped connection objects in place, so count connect() calls
+            conn = new_conn()
+            connect = conn.connect
+
+            def counted_connect():
+                self.on_new_connection(host)
+                return connect()
+
+            conn.connect = counted_connect
+            return conn
+
+        pool._new_conn = counted_new_conn
+        return pool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, on_new_connection, **kwargs):
+        self.on_new_connection = on_new_connection
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager = _CountingPoolManager(
+            self.on_new_connection, num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs
+        )
+
+
+class HostPool:
+    """Keep-alive HTTP session with one connection pool per host and reuse stats."""
+
+    def __init__(self, pool_size=10, max_hosts=100, retries=1, backoff_factor=0.3, keep_alive=True):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.connections = defaultdict(int)
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+        adapter = _CountingAdapter(self._count_connection, pool_connections=max_hosts,
+                                   pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Connection"] = "keep-alive" if keep_alive else "close"
+        self.session.hooks["response"].append(self._count_request)
+
+    def _count_connection(self, host):
+        with self.lock:
+            self.connections[host] += 1
+
+    def _count_request(self, response, *args, **kwargs):
+        with self.lock:
+            self.requests[urlparse(response.url).hostname] += 1
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.session.head(url, **kwargs)
+
+    def log_stats(self):
+        """Log per-host request and connection counts, busiest hosts first."""
+        with self.lock:
+            hosts = sorted(set(self.requests) | set(self.connections), key=lambda h: -self.requests[h])
+            total_requests = sum(self.requests.values())
+            total_connections = sum(self.connections.values())
+            for host in hosts:
+                reused = max(self.requests[host] - self.connections[host], 0)
+                logging.info(f"Connections to {host}: {self.requests[host]} requests over "
+                             f"{self.connections[host]} connections ({reused} reused)")
+        logging.info(f"Connection pool: {total_requests} requests over {total_connections} connections "
+                     f"to {len(hosts)} hosts")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,84 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "links.sqlite")
+ALIVE_TTL = 24 * 3600  # Working links are trusted for a day
+DEAD_TTL = 6 * 3600  # Failures are often transient, so retry them sooner
+FLUSH_ROWS = 500
+
+
+class LinkStatusCache:
+    """SQLite store of link check results that outlives a single run.
+
+    A result is fresh for ALIVE_TTL if the link worked and DEAD_TTL if it did
+    not; stale results are ignored so the link gets probed again. Writes are
+    buffered and saved in batches.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, alive_ttl=ALIVE_TTL, dead_ttl=DEAD_TTL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.alive_ttl = alive_ttl
+        self.dead_ttl = dead_ttl
+        self.lock = threading.Lock()
+        self.pending = []
+        self.recent = {}  # Results checked by this process, saved or not
+        self.hits = self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS links ("
+                "url TEXT PRIMARY KEY, is_active INTEGER NOT NULL, working_url TEXT NOT NULL, checked_at REAL NOT NULL)"
+            )
+            deleted = self.conn.execute(
+                "DELETE FROM links WHERE checked_at < ?", (time.time() - max(alive_ttl, dead_ttl),)
+            ).rowcount
+        if deleted:
+            logging.info(f"Pruned {deleted} expired link results from {path}")
+
+    def get(self, url):
+        """Return (is_active, working_url) if a fresh result is stored, else None."""
+        now = time.time()
+        with self.lock:
+            if url in self.recent:
+                self.hits += 1
+                return self.recent[url]
+            row = self.conn.execute(
+                "SELECT is_active, working_url, checked_at FROM links WHERE url = ?", (url,)
+            ).fetchone()
+            if row is not None:
+                is_active, working_url, checked_at = row
+                if now - checked_at < (self.alive_ttl if is_active else self.dead_ttl):
+                    self.hits += 1
+                    return bool(is_active), working_url
+            self.misses += 1
+        return None
+
+    def put(self, url, is_active, working_url):
+        with self.lock:
+            self.recent[url] = (is_active, working_url)
+            self.pending.append((url, int(is_active), working_url, time.time()))
+            if len(self.pending) >= FLUSH_ROWS:
+                self._flush()
+
+    def recent_results(self):
+        """{url: (is_active, working_url)} for every link checked by this process."""
+        with self.lock:
+            return dict(self.recent)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+            logging.info(f"Link status cache: {self.hits} fresh results reused, {self.misses} links probed")
+
+    def _flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO links (url, is_active, working_url, checked_at) VALUES (?, ?, ?, ?)",
+                self.pending,
+            )
+        self.pending.clear()
@@ -0,0 +1,472 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import ssl
+import time
+from collections import defaultdict
+from urllib.parse import urljoin, urlsplit
+
+from requests.utils import requote_uri
+
+from dns_cache import NegativeDnsCache
+from host_latency import LatencyHistograms
+from stream_probe import ALIVE, DEEP_PROBE_DEADLINE, PROBE_BYTES, classify_prefix, deep_probe_steps
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+MAX_IN_FLIGHT = 1000  # Concurrent probes; each holds at most one socket
+PER_HOST_LIMIT = 8  # Concurrent requests to any one host
+BREAKER_THRESHOLD = 5  # Consecutive connection failures or timeouts that open a host's circuit
+BREAKER_COOLDOWN = 60  # Seconds an open circuit fails requests before letting one through again
+MAX_REDIRECTS = 10
+MAX_HEADER_BYTES = 64 * 1024
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+DNS_TIMEOUT = 5
+MAX_DNS_LOOKUPS = 64  # Concurrent getaddrinfo calls, each runs on an executor thread
+NXDOMAIN_ERRORS = {socket.EAI_NONAME} | ({socket.EAI_NODATA} if hasattr(socket, "EAI_NODATA") else set())
+
+
+DEFERRED = None  # is_active for a link skipped because its host's circuit was open
+
+
+class ProbeError(Exception):
+    """A probe request failed before a status line was received."""
+
+
+class ProbeTimeout(ProbeError):
+    pass
+
+
+class CircuitOpen(ProbeError):
+    """The host failed too often recently, so the request was not sent."""
+
+
+class _HostState:
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.skipped = 0
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncLinkChecker:
+    """Checks thousands of links concurrently on one asyncio loop.
+
+    Only the status line and headers of each response are read, so memory
+    stays bounded by the number of probes in flight rather than the number
+    of links. HEAD responses leave the connection reusable for the next
+    probe to the same host. In "ranged" mode the GET fallback asks for the
+    first PROBE_BYTES of the body and only counts the link as active if
+    that prefix looks like a stream (see stream_probe). In "deep" mode an
+    HLS link is followed through its playlists to a ranged fetch of the
+    first segment instead, and only the verdicts in deep_verdicts count.
+
+    Each host gets at most per_host requests at a time. After
+    breaker_threshold consecutive connection failures or timeouts its circuit
+    opens, and requests to it fail immediately for breaker_cooldown seconds,
+    so a dead origin costs a handful of timeouts instead of one per URL.
+    Links skipped that way come back DEFERRED rather than inactive.
+
+    Timeouts adapt per host from the latency histograms of earlier requests
+    (see host_latency); the timeout passed to check_all is only used for
+    hosts without enough history.
+
+    Every distinct host is resolved concurrently before probing starts and
+    connections go straight to the resolved addresses. Hosts that do not
+    exist are remembered across runs (see dns_cache), and their URLs fail
+    without a lookup.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, per_host=PER_HOST_LIMIT, breaker_threshold=BREAKER_THRESHOLD,
+                 breaker_cooldown=BREAKER_COOLDOWN, user_agent=DEFAULT_USER_AGENT, latency=None, dns_cache=None):
+        self.max_in_flight = max_in_flight
+        self.per_host = per_host
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.user_agent = user_agent
+        self.latency = latency or LatencyHistograms()
+        self.dns_cache = dns_cache or NegativeDnsCache()
+        self.addresses = {}  # hostname -> resolved addresses, or None if it did not resolve
+        self.lookups = {}
+        self.dns_slots = None
+        self.dns_rejected = 0
+        self.adapted = set()
+        self.ssl_context = ssl.create_default_context()
+        self.idle = defaultdict(list)
+        self.slots = {}
+        self.hosts = defaultdict(_HostState)  # Kept across check_all calls, like the open circuits
+        self.requests = 0
+        self.connections = 0
+
+    def check_all(self, urls, timeout=2, swap_protocol=True, mode="status", deep_verdicts=(ALIVE,)):
+        """Probe every url and return {url: (is_active, working_url)}.
+
+        is_active is None (DEFERRED) for a url that was not probed because its
+        host's circuit was open: nothing is known about it, so callers should
+        neither cache it nor treat it as dead. mode is "status" to judge links by status code alone, "ranged" to
+        also classify the first bytes of the body when HEAD fails, or "deep"
+        to require a deep probe verdict in deep_verdicts.
+        """
+        urls = list(urls)
+        if not urls:
+            return {}
+        self.requests = self.connections = self.dns_rejected = 0
+        self.adapted.clear()
+        start = time.perf_counter()
+        results = asyncio.run(self._check_all(urls, timeout, swap_protocol, mode, deep_verdicts))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        active = sum(1 for is_active, _ in results.values() if is_active)
+        deferred = sum(1 for is_active, _ in results.values() if is_active is DEFERRED)
+        logging.info(f"Link check: {len(urls)} links in {elapsed:.2f}s ({len(urls) / elapsed:.1f} probes/s), "
+                     f"{active} active, {deferred} deferred by open circuits, {self.requests} requests over {self.connections} connections, "
+                     f"{len(self.adapted)} hosts on adaptive timeouts, {self.dns_rejected} requests rejected by DNS")
+        self.latency.save()
+        self.dns_cache.save()
+        self.log_host_failures()
+        return results
+
+    def log_host_failures(self):
+        """Log failure counts for every host that failed at least once, worst first."""
+        failing = sorted((item for item in self.hosts.items() if item[1].failures or item[1].skipped),
+                         key=lambda item: -(item[1].failures + item[1].skipped))
+        for host, state in failing:
+            status = "circuit open" if state.open_until > time.monotonic() else "circuit closed"
+            logging.info(f"Host {host}: {state.failures} failures in {state.requests} requests, "
+                         f"{state.skipped} skipped ({status})")
+        if failing:
+            logging.info(f"{len(failing)} of {len(self.hosts)} hosts had failures")
+
+    async def _check_all(self, urls, timeout, swap_protocol, mode, deep_verdicts):
+        results = {}
+        pending = iter(urls)
+
+        self.dns_slots = asyncio.Semaphore(MAX_DNS_LOOKUPS)
+        await self._resolve_all({urlsplit(url).hostname for url in urls} - {None})
+
+        async def worker():
+            # A fixed set of workers pulls urls, so in-flight work never exceeds max_in_flight
+            for url in pending:
+                results[url] = await self.probe(url, timeout, swap_protocol, mode, deep_verdicts)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.max_in_flight, len(urls)))))
+        finally:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle.clear()
+            self.slots.clear()  # Semaphores and lookup tasks belong to this event loop
+            self.lookups.clear()
+        return results
+
+    async def _resolve_all(self, hostnames):
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.resolve(hostname) for hostname in hostnames))
+        failed = sum(1 for addresses in results if addresses is None)
+        logging.info(f"DNS: {len(hostnames)} hosts in {time.perf_counter() - start:.2f}s, "
+                     f"{len(hostnames) - failed} resolved, {failed} unresolvable")
+
+    async def resolve(self, hostname):
+        """Resolved addresses for hostname, or None if it does not resolve.
+
+        Answers and NXDOMAIN/NODATA are kept for the process. A timeout or
+        other transient failure is only shared by the probes already waiting
+        on that lookup, and the next probe to the host looks it up again.
+        """
+        if hostname in self.addresses:
+            return self.addresses[hostname]
+        if hostname not in self.lookups:
+            self.lookups[hostname] = asyncio.ensure_future(self._lookup(hostname))
+        lookup = self.lookups[hostname]
+        addresses, final = await lookup
+        if final:
+            self.addresses[hostname] = addresses
+        elif self.lookups.get(hostname) is lookup:
+            del self.lookups[hostname]
+        return addresses
+
+    async def _lookup(self, hostname):
+        """Return (addresses or None, whether the answer can be kept)."""
+        try:
+            return [str(ipaddress.ip_address(hostname))], True
+        except ValueError:
+            pass
+        if self.dns_cache.error(hostname):
+            return None, True
+        async with self.dns_slots:
+            try:
+                infos = await asyncio.wait_for(
+                    asyncio.get_running_loop().getaddrinfo(hostname, None, type=socket.SOCK_STREAM), DNS_TIMEOUT
+                )
+            except socket.gaierror as e:
+                logging.warning(f"Cannot resolve {hostname}: {e}")
+                if e.errno in NXDOMAIN_ERRORS:
+                    self.dns_cache.mark_dead(hostname, str(e))
+                    return None, True
+                return None, False
+            except UnicodeError as e:
+                logging.warning(f"Cannot resolve {hostname}: {e}")
+                return None, True  # The name cannot be encoded, retrying will not help
+            except (asyncio.TimeoutError, OSError) as e:
+                logging.warning(f"Cannot resolve {hostname}: {e or type(e).__name__}")
+                return None, False
+        return list(dict.fromkeys(info[4][0] for info in infos)) or None, True
+
+    async def probe(self, url, timeout, swap_protocol=True, mode="status", deep_verdicts=(ALIVE,)):
+        """HEAD, then GET if HEAD errors, then HEAD on the other scheme unless the GET timed out."""
+        try:
+            if mode == "deep":
+                verdict = await self.deep_probe(url, timeout)
+                logging.info(f"Checked {url}: {verdict} (deep)")
+                return verdict in deep_verdicts, url
+            try:
+                status = await self.request("HEAD", url, timeout)
+                is_active = status < 400
+                logging.info(f"Checked {url}: {'Active' if is_active else 'Inactive'} (HEAD)")
+                return is_active, url
+            except CircuitOpen:
+                raise
+            except ProbeError:
+                pass
+            return await self._probe_get(url, timeout, swap_protocol, mode)
+        except CircuitOpen as e:
+            logging.info(f"Deferred {url}: {e}")
+            return DEFERRED, url
+
+    async def _probe_get(self, url, timeout, swap_protocol, mode):
+        try:
+            if mode == "ranged":
+                status, prefix, _ = await self.fetch_prefix(url, timeout)
+                kind = classify_prefix(prefix) if status < 400 else None
+                is_active = kind is not None
+                logging.info(f"Checked {url}: {'Active' if is_active else 'Inactive'} (ranged GET, {kind or 'no stream'})")
+            else:
+                status = await self.request("GET", url, timeout)
+                is_active = status < 400
+                logging.info(f"Checked {url}: {'Active' if is_active else 'Inactive'} (GET)")
+            return is_active, url
+        except CircuitOpen:
+            raise
+        except ProbeError as e:
+            logging.warning(f"Link check failed for {url}: {e}")
+            if not swap_protocol or isinstance(e, ProbeTimeout):
+                return False, url
+        if url.startswith('http://'):
+            alt_url = url.replace('http://', 'https://', 1)
+        else:
+            alt_url = url.replace('https://', 'http://', 1)
+        try:
+            if await self.request("HEAD", alt_url, timeout) < 400:
+                logging.info(f"Checked {alt_url}: Active (HEAD, switched protocol)")
+                return True, alt_url
+        except ProbeError:
+            pass
+        return False, url
+
+    async def deep_probe(self, url, timeout, deadline=DEEP_PROBE_DEADLINE):
+        """Follow url through its playlists to the first segment and return ALIVE, PLAYLIST_ONLY or DEAD.
+
+        Requests go through the same pools and host limits as other probes,
+        and whichever one is in flight when deadline seconds pass is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + deadline
+        steps = deep_probe_steps(url)
+        request_url, max_bytes, verdict = next(steps)
+        try:
+            while True:
+                remaining = give_up_at - loop.time()
+                if remaining <= 0:
+                    return verdict
+                try:
+                    response = await asyncio.wait_for(self.fetch_prefix(request_url, timeout, max_bytes), remaining)
+                except CircuitOpen:
+                    if request_url == url:
+                        raise  # Nothing was fetched, so there is no verdict to give
+                    return verdict
+                except (ProbeError, asyncio.TimeoutError):
+                    return verdict
+                request_url, max_bytes, verdict = steps.send(response)
+        except StopIteration as done:
+            return done.value
+
+    async def request(self, method, url, timeout):
+        """Send method to url, following redirects, and return the final status code."""
+        status, _, _ = await self._request(method, url, timeout, 0)
+        return status
+
+    async def fetch_prefix(self, url, timeout, max_bytes=PROBE_BYTES):
+        """GET at most max_bytes of url with a Range header, following redirects. Returns (status, prefix, final_url)."""
+        return await self._request("GET", url, timeout, max_bytes)
+
+    async def _request(self, method, url, timeout, max_bytes):
+        for _ in range(MAX_REDIRECTS + 1):
+            status, headers, body = await self._send(method, url, timeout, max_bytes)
+            location = headers.get("location")
+            if status not in REDIRECT_STATUSES or not location:
+                return status, body, url
+            url = urljoin(url, location)
+        raise ProbeError(f"Exceeded {MAX_REDIRECTS} redirects")
+
+    async def _send(self, method, url, timeout, max_bytes=0):
+        """Send one request through the host's concurrency cap and circuit breaker."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ProbeError(f"Unsupported URL {url!r}")
+        try:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+        except ValueError as e:
+            raise ProbeError(str(e)) from None
+        addresses = await self.resolve(parts.hostname)
+        if addresses is None:
+            self.dns_rejected += 1
+            raise ProbeError(f"Cannot resolve {parts.hostname}")
+        hostname = f"{parts.hostname}:{port}"  # Origins on other ports of the same name fail independently
+        state = self.hosts[hostname]
+        if state.open_until > time.monotonic():
+            state.skipped += 1
+            raise CircuitOpen(f"Circuit open for {hostname}")
+        if hostname not in self.slots:
+            self.slots[hostname] = asyncio.Semaphore(self.per_host)
+        async with self.slots[hostname]:
+            if state.open_until > time.monotonic():
+                state.skipped += 1
+                raise CircuitOpen(f"Circuit open for {hostname}")
+            state.requests += 1
+            host_timeout = self.latency.timeout(hostname, timeout)
+            if host_timeout != timeout:
+                self.adapted.add(hostname)
+            started = time.perf_counter()
+            try:
+                response = await self._send_once(method, parts, port, addresses, host_timeout, max_bytes)
+            except ProbeError as e:
+                if isinstance(e, ProbeTimeout):
+                    self.latency.record_timeout(hostname, host_timeout)
+                state.failures += 1
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.breaker_threshold:
+                    now = time.monotonic()
+                    if state.open_until <= now:
+                        logging.warning(f"Opening circuit for {hostname} after {state.consecutive_failures} consecutive failures")
+                    state.open_until = now + self.breaker_cooldown
+                raise
+            state.consecutive_failures = 0
+            self.latency.record(hostname, time.perf_counter() - started)
+            return response
+
+    async def _send_once(self, method, parts, port, addresses, timeout, max_bytes=0):
+        key = (parts.scheme, parts.hostname, port)
+        # Spaces and non-ASCII characters are percent-encoded as requests does; existing escapes are kept
+        target = requote_uri((parts.path or "/") + (f"?{parts.query}" if parts.query else ""))
+        try:
+            ascii_host = parts.hostname.encode("idna").decode("ascii")
+        except UnicodeError as e:
+            raise ProbeError(f"Invalid hostname {parts.hostname!r}: {e}") from None
+        host = ascii_host if port in (80, 443) else f"{ascii_host}:{port}"
+        byte_range = f"Range: bytes=0-{max_bytes - 1}\r\n" if max_bytes else ""
+        request = (f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {self.user_agent}\r\n"
+                   f"Accept: */*\r\n{byte_range}Connection: keep-alive\r\n\r\n").encode("latin-1", errors="ignore")
+
+        async def exchange():
+            """Connect if needed, send the request and read the head and prefix of the response."""
+            nonlocal conn
+            if conn is None:
+                conn = await self._connect(key, addresses)
+            conn.writer.write(request)
+            status, headers, keep_alive = await self._read_head(conn.reader)
+            body = b""
+            if max_bytes and status not in REDIRECT_STATUSES and status not in (204, 304):
+                body = await self._read_prefix(conn.reader, headers, max_bytes)
+            return status, headers, keep_alive, body
+
+        while True:
+            conn = self.idle[key].pop() if self.idle[key] else None
+            try:
+                # One budget for the whole exchange, so a slow connect leaves less time to read
+                status, headers, keep_alive, body = await asyncio.wait_for(exchange(), timeout)
+            except asyncio.TimeoutError:
+                if conn is not None:
+                    conn.close()
+                raise ProbeTimeout(f"Timed out after {timeout}s") from None
+            except asyncio.CancelledError:
+                if conn is not None:
+                    conn.close()  # A half-read response cannot be reused
+                raise
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+                if conn is not None:
+                    conn.close()
+                    if conn.reused:
+                        continue  # The server dropped an idle connection, retry on a fresh one
+                raise ProbeError(str(e) or type(e).__name__) from None
+            self.requests += 1
+            # Bodies are never read to the end, so only bodiless HEAD responses leave the connection reusable
+            if method == "HEAD" and keep_alive:
+                conn.reused = True
+                self.idle[key].append(conn)
+            else:
+                conn.close()
+            return status, headers, body
+
+    async def _connect(self, key, addresses):
+        """Connect to the first reachable pre-resolved address, verifying TLS against the hostname."""
+        scheme, hostname, port = key
+        tls = {"ssl": self.ssl_context, "server_hostname": hostname.encode("idna").decode("ascii")} if scheme == "https" else {}
+        for address in addresses:
+            try:
+                reader, writer = await asyncio.open_connection(address, port, limit=MAX_HEADER_BYTES, **tls)
+                break
+            except OSError as e:
+                error = e
+        else:
+            raise error
+        self.connections += 1
+        return _Connection(reader, writer)
+
+    async def _read_head(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        version, status = lines[0].split(" ", 2)[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        return int(status), headers, keep_alive
+
+    async def _read_prefix(self, reader, headers, max_bytes):
+        """Read at most max_bytes of the response body, undoing chunked transfer encoding."""
+        body = b""
+        try:
+            if "chunked" in headers.get("transfer-encoding", "").lower():
+                while len(body) < max_bytes:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    if size == 0:
+                        break
+                    remaining = max_bytes - len(body)
+                    body += await reader.readexactly(min(size, remaining))
+                    if size > remaining:
+                        break
+                    await reader.readline()
+                return body
+            limit = min(int(headers.get("content-length", max_bytes)), max_bytes)
+            while len(body) < limit:
+                data = await reader.read(limit - len(body))
+                if not data:
+                    break
+                body += data
+        except asyncio.IncompleteReadError as e:
+            body += e.partial  # Whatever arrived before the server hung up is still worth classifying
+        return body
@@ -0,0 +1,185 @@
+"""Per-URL check history for the stream checkers (processed_links), kept in SQLite.
+
+Each checker used to load and rewrite a processed_links-XX.json file with its
+whole history. LinkHistory looks entries up by URL on demand and only
+upserts the ones that changed.
+
+The database lives in the workflow cache, which can be evicted or belong to
+another workflow, so the committed processed_links-XX.json stays the copy of
+record. The workflows export it once a run is done:
+
+    python BugsfreeMain/link_history.py .cache/processed_links-BD.sqlite [out.json]
+
+writes a database as JSON in the old format, to stdout or out.json. A
+database remembers the digest of the JSON it was last exported to or merged
+from, and only merges the JSON again, newer checks winning, when it is new
+or the file has changed since, so a run normally reads nothing but the rows
+it looks up.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+
+from output_writer import write_if_changed
+
+
+class LinkHistory:
+    """Dict-like map of url -> {"last_checked", "is_active", "failures"} backed by SQLite.
+
+    Supports the operations the stream checkers use on processed_links: `in`,
+    indexing, get, assignment and len. Rows are read on first access and
+    assignments are held in memory until save(). With json_path, the JSON
+    copy is merged in on open if the database has not seen it yet.
+    """
+
+    def __init__(self, path, json_path=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.json_path = json_path
+        self.lock = threading.Lock()
+        self.rows = {}  # url -> entry, or None if the url has no history
+        self.dirty = set()
+        self.added = set()  # Dirty urls that are not in the database yet
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS links ("
+                "url TEXT PRIMARY KEY, last_checked REAL NOT NULL, is_active INTEGER NOT NULL, failures INTEGER)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if json_path and os.path.exists(json_path):
+            self._merge(json_path)
+
+    def _merge(self, json_path):
+        try:
+            with open(json_path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest == self._meta("json_digest"):
+                return  # Already merged, or exported from this database
+            entries = json.loads(data)
+        except Exception as e:
+            logging.error(f"Failed to load {json_path}: {e}")
+            return
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT INTO links (url, last_checked, is_active, failures) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET last_checked = excluded.last_checked, "
+                "is_active = excluded.is_active, failures = excluded.failures "
+                "WHERE excluded.last_checked > links.last_checked",
+                ((url, entry.get("last_checked", 0), int(entry.get("is_active", False)), entry.get("failures"))
+                 for url, entry in entries.items()),
+            )
+            merged = self.conn.total_changes - before
+            self._set_meta("json_digest", digest)
+        if merged:
+            logging.info(f"Merged {merged} newer processed links from {json_path} into {self.path}")
+
+    def _meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _load(self, url):
+        if url not in self.rows:
+            row = self.conn.execute(
+                "SELECT last_checked, is_active, failures FROM links WHERE url = ?", (url,)
+            ).fetchone()
+            self.rows[url] = None if row is None else _entry(*row)
+        return self.rows[url]
+
+    def __contains__(self, url):
+        with self.lock:
+            return self._load(url) is not None
+
+    def __getitem__(self, url):
+        with self.lock:
+            entry = self._load(url)
+        if entry is None:
+            raise KeyError(url)
+        return entry
+
+    def get(self, url, default=None):
+        with self.lock:
+            entry = self._load(url)
+        return default if entry is None else entry
+
+    def __setitem__(self, url, entry):
+        with self.lock:
+            if self._load(url) is None:
+                self.added.add(url)
+            self.rows[url] = entry
+            self.dirty.add(url)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM links").fetchone()[0] + len(self.added)
+
+    def save(self):
+        """Upsert the entries assigned since the last save and return how many there were."""
+        with self.lock:
+            changed = [(url, self.rows[url]) for url in self.dirty]
+            self.dirty.clear()
+            self.added.clear()
+            if not changed:
+                return 0
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO links (url, last_checked, is_active, failures) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(url) DO UPDATE SET last_checked = excluded.last_checked, "
+                    "is_active = excluded.is_active, failures = excluded.failures",
+                    ((url, entry.get("last_checked", 0), int(entry.get("is_active", False)), entry.get("failures"))
+                     for url, entry in changed),
+                )
+        return len(changed)
+
+    def to_json(self):
+        """Every stored entry as JSON, in the layout of the old files."""
+        with self.lock:
+            rows = self.conn.execute("SELECT url, last_checked, is_active, failures FROM links ORDER BY url").fetchall()
+        return json.dumps({url: _entry(*row) for url, *row in rows}, indent=2)
+
+    def export(self, f):
+        """Write every stored entry to the file object f as JSON."""
+        f.write(self.to_json())
+
+    def export_json(self, path):
+        """Write every stored entry to path as JSON unless it already holds them. Returns whether it wrote.
+
+        The database remembers the file, so opening it with that json_path
+        does not merge it back in.
+        """
+        content = self.to_json()
+        written = write_if_changed(path, content)
+        with self.lock, self.conn:
+            self._set_meta("json_digest", hashlib.sha256(content.encode("utf-8")).hexdigest())
+        return written
+
+
+def _entry(last_checked, is_active, failures):
+    entry = {"last_checked": last_checked, "is_active": bool(is_active)}
+    if failures is not None:
+        entry["failures"] = failures
+    return entry
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or not os.path.exists(sys.argv[1]):
+        sys.exit("usage: link_history.py DATABASE [OUTPUT.json]")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # Checks committed since this database last saw the file are merged in first, so none are lost
+    history = LinkHistory(sys.argv[1], json_path=sys.argv[2] if len(sys.argv) == 3 else None)
+    if len(sys.argv) == 3:
+        if history.export_json(sys.argv[2]):
+            logging.info(f"Exported {len(history)} processed links to {sys.argv[2]}")
+    else:
+        history.export(sys.stdout)
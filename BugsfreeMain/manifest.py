@@ -0,0 +1,14 @@
+import json
+import os
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources.json")
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Source URLs for every collector, keyed by script name (e.g. "TV-Bangladesh")."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_sources(name, path=MANIFEST_PATH):
+    return load_manifest(path)[name]
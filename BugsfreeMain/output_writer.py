@@ -0,0 +1,42 @@
+import hashlib
+import os
+import tempfile
+
+
+def write_atomic(path, content):
+    """Write text to path through a temporary file and a rename, so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files readable by the owner only
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _digest(data):
+    return hashlib.sha256(data).digest()
+
+
+def write_if_changed(path, content):
+    """Write text to path with write_atomic unless the file already holds it. Returns whether it wrote."""
+    data = content.encode("utf-8")
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if _digest(f.read()) == _digest(data):
+                return False
+    write_atomic(path, content)
+    return True
+
+
+def remove_stale(directory, keep, suffix=".m3u8"):
+    """Delete the files ending in suffix in directory whose names are not in keep. Returns how many."""
+    stale = {name for name in os.listdir(directory) if name.endswith(suffix)} - set(keep)
+    for name in stale:
+        os.remove(os.path.join(directory, name))
+    return len(stale)
+
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "parsed.sqlite")
+MAX_AGE = 30 * 24 * 3600  # Drop parse results not used for 30 days
+BATCH_ROWS = 1000  # Rows compressed and stored together as one chunk
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class ParseCache:
+    """SQLite store of parsed channel rows keyed by a hash of the source body.
+
+    Rows are stored as chunks of BATCH_ROWS zlib-compressed newline-delimited
+    JSON rows, written while the parse runs and read back one chunk at a
+    time, so neither side holds more than a chunk in memory. A result only
+    counts as cached once its entries row is written after the last chunk.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=MAX_AGE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS parsed")  # Whole-blob layout of earlier versions
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "body_hash TEXT NOT NULL, parser TEXT NOT NULL, chunks INTEGER NOT NULL, used_at REAL NOT NULL, "
+                "PRIMARY KEY (body_hash, parser))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "body_hash TEXT NOT NULL, parser TEXT NOT NULL, seq INTEGER NOT NULL, rows BLOB NOT NULL, "
+                "PRIMARY KEY (body_hash, parser, seq))"
+            )
+            deleted = self.conn.execute("DELETE FROM entries WHERE used_at < ?", (time.time() - max_age,)).rowcount
+            # Chunks of pruned entries and of parses that were never finished
+            self.conn.execute(
+                "DELETE FROM chunks WHERE NOT EXISTS (SELECT 1 FROM entries "
+                "WHERE entries.body_hash = chunks.body_hash AND entries.parser = chunks.parser)"
+            )
+        if deleted:
+            logging.info(f"Pruned {deleted} stale parse results from {path}")
+
+    def get(self, body_hash, parser):
+        """Return an iterator over the cached rows for this body and parser, or None."""
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT chunks FROM entries WHERE body_hash = ? AND parser = ?", (body_hash, parser)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE entries SET used_at = ? WHERE body_hash = ? AND parser = ?", (time.time(), body_hash, parser)
+            )
+        return self._iter_rows(body_hash, parser, row[0])
+
+    def _iter_rows(self, body_hash, parser, chunks):
+        """Decompress the stored chunks one at a time."""
+        for seq in range(chunks):
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT rows FROM chunks WHERE body_hash = ? AND parser = ? AND seq = ?", (body_hash, parser, seq)
+                ).fetchone()
+            yield from json.loads(b"[" + zlib.decompress(row[0]).replace(b"\n", b",") + b"]")
+
+    def _put_chunk(self, body_hash, parser, seq, batch):
+        blob = zlib.compress("\n".join(batch).encode("utf-8"))
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO chunks (body_hash, parser, seq, rows) VALUES (?, ?, ?, ?)",
+                (body_hash, parser, seq, blob),
+            )
+
+    def record(self, body_hash, parser, rows):
+        """Pass rows through unchanged, storing them a chunk at a time and marking them cached once exhausted.
+
+        The same body and parser always give the same rows, so two runs
+        recording them at once write identical chunks.
+        """
+        batch = []
+        seq = 0
+        for row in rows:
+            batch.append(_ENCODER.encode(row))
+            if len(batch) >= BATCH_ROWS:
+                self._put_chunk(body_hash, parser, seq, batch)
+                seq += 1
+                batch.clear()
+            yield row
+        if batch:
+            self._put_chunk(body_hash, parser, seq, batch)
+            seq += 1
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (body_hash, parser, chunks, used_at) VALUES (?, ?, ?, ?)",
+                (body_hash, parser, seq, time.time()),
+            )
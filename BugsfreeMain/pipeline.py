@@ -0,0 +1,154 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+QUEUE_SIZE = 256  # Items buffered in front of each stage
+REPORT_INTERVAL = 5  # Seconds between progress lines while a pipeline runs
+
+_DONE = object()
+
+
+class Stage:
+    """One step of a Pipeline: `workers` threads feeding items through fn.
+
+    fn takes one item and returns an iterable of items for the next stage,
+    empty to drop it. When the input runs out, flush() is called once and
+    its items are passed on too. With priority, the input queue hands out
+    the lowest priority(item) first among the items waiting in it.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=QUEUE_SIZE, flush=None, priority=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.flush = flush
+        self.priority = priority
+        self.queue = queue.PriorityQueue(queue_size) if priority else queue.Queue(queue_size)
+        self.order = itertools.count()  # Keeps equal priorities first in, first out
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.received = self.emitted = self.peak_depth = 0
+        self.finished_workers = 0
+
+    def tally(self, key, n=1):
+        """Add to a named counter reported with the stage's summary."""
+        with self.lock:
+            self.counts[key] += n
+
+    def put(self, item):
+        """Queue item for this stage, blocking while the queue is full."""
+        if self.priority:
+            self.queue.put((0, self.priority(item), next(self.order), item))
+        else:
+            self.queue.put(item)
+        depth = self.queue.qsize()
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+
+    def close(self):
+        for _ in range(self.workers):
+            self.queue.put((1, (), next(self.order), _DONE) if self.priority else _DONE)
+
+    def get(self):
+        item = self.queue.get()
+        return item[-1] if self.priority else item
+
+
+class Pipeline:
+    """Stages connected by bounded queues, each running on its own threads.
+
+    Items flow from one stage to the next as soon as they are produced, and
+    a full queue blocks the stage feeding it, so a slow stage holds back the
+    ones before it instead of letting work pile up in memory. Each stage's
+    throughput and queue depth are logged every report_interval seconds and
+    summarised at the end.
+    """
+
+    def __init__(self, stages, report_interval=REPORT_INTERVAL):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.outputs = []
+        self.finished = threading.Event()
+
+    def run(self, items):
+        """Feed items through every stage and return what the last stage emitted."""
+        self.start = time.perf_counter()
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads += [threading.Thread(target=self._work, args=(index,), daemon=True) for _ in range(stage.workers)]
+        reporter = threading.Thread(target=self._report, daemon=True)
+        for thread in threads:
+            thread.start()
+        reporter.start()
+        for thread in threads:
+            thread.join()
+        self.finished.set()
+        reporter.join()
+        self._summarise()
+        return self.outputs
+
+    def _feed(self, items):
+        first = self.stages[0]
+        try:
+            for item in items:
+                first.put(item)
+        finally:
+            first.close()
+
+    def _work(self, index):
+        stage = self.stages[index]
+        while True:
+            item = stage.get()
+            if item is _DONE:
+                break
+            with stage.lock:
+                stage.received += 1
+            try:
+                for output in stage.fn(item):
+                    self._emit(index, output)
+            except Exception as e:
+                logging.error(f"Pipeline stage {stage.name} failed on an item: {e}")
+        with stage.lock:
+            stage.finished_workers += 1
+            last = stage.finished_workers == stage.workers
+        if not last:
+            return
+        # The last worker out flushes the stage and closes the next one
+        try:
+            if stage.flush:
+                for output in stage.flush():
+                    self._emit(index, output)
+        except Exception as e:
+            logging.error(f"Pipeline stage {stage.name} failed to flush: {e}")
+        finally:
+            if index + 1 < len(self.stages):
+                self.stages[index + 1].close()
+
+    def _emit(self, index, output):
+        stage = self.stages[index]
+        with stage.lock:
+            stage.emitted += 1
+        if index + 1 < len(self.stages):
+            self.stages[index + 1].put(output)
+        else:
+            with stage.lock:
+                self.outputs.append(output)
+
+    def _report(self):
+        while not self.finished.wait(self.report_interval):
+            elapsed = time.perf_counter() - self.start
+            logging.info(f"Pipeline at {elapsed:.0f}s: " + ", ".join(
+                f"{stage.name} {stage.received} in/{stage.emitted} out, {stage.queue.qsize()} queued"
+                for stage in self.stages))
+
+    def _summarise(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        for stage in self.stages:
+            counts = "".join(f", {n} {key}" for key, n in sorted(stage.counts.items()))
+            logging.info(f"Stage {stage.name}: {stage.received} in ({stage.received / elapsed:.1f}/s), "
+                         f"{stage.emitted} out, peak queue {stage.peak_depth}/{stage.queue_size}{counts}")
+        logging.info(f"Pipeline finished in {elapsed:.1f}s")
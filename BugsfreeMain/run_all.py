@@ -0,0 +1,76 @@
+"""Run every TV and Movies collector listed in sources.json in one process.
+
+The collectors share one connection pool, source cache, parse cache and
+link-status cache, so an upstream listed by several collectors is downloaded
+once and every later collector starts on warm connections.
+
+    python BugsfreeMain/run_all.py [TV-Bangladesh Movies-VOD ...]
+"""
+import importlib.util
+import logging
+import os
+import sys
+import time
+
+from http_pool import HostPool
+from link_cache import LinkStatusCache
+from link_checker import AsyncLinkChecker
+from manifest import load_manifest
+from parse_cache import ParseCache
+from source_cache import SourceCache
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def load_script(name):
+    """Import a collector script such as TV-Bangladesh.py as a module."""
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.join(SCRIPT_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    manifest = load_manifest()
+    names = sys.argv[1:] or list(manifest)
+    unknown = [name for name in names if name not in manifest]
+    if unknown:
+        logging.error(f"Not in sources.json: {', '.join(unknown)}")
+        sys.exit(1)
+
+    all_sources = [url for name in names for url in manifest[name]]
+    logging.info(f"Running {len(names)} collectors over {len(all_sources)} sources ({len(set(all_sources))} unique)")
+
+    http_pool = HostPool()
+    shared = {
+        "http_pool": http_pool,
+        "source_cache": SourceCache(),
+        "parse_cache": ParseCache(),
+        "link_cache": LinkStatusCache(),
+        "link_checker": AsyncLinkChecker(),
+    }
+    timings = []
+    failed = []
+    start = time.perf_counter()
+    for name in names:
+        started = time.perf_counter()
+        try:
+            load_script(name).main(**shared)
+        except Exception as e:
+            logging.error(f"{name} failed: {e}")
+            failed.append(name)
+        timings.append((name, time.perf_counter() - started))
+
+    http_pool.log_stats()
+    shared["link_checker"].log_host_failures()
+    for name, elapsed in timings:
+        logging.info(f"{name}: {elapsed:.1f}s")
+    logging.info(f"Ran {len(names)} collectors in {time.perf_counter() - start:.1f}s, {len(failed)} failed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "sources")
+CHUNK_SIZE = 64 * 1024
+
+
+def local_path(source):
+    """The file path of a source given as a local path or file:// URI, or None for a remote URL."""
+    if source.startswith("file://"):
+        return url2pathname(urlparse(source).path)
+    if "://" in source:
+        return None
+    return source
+
+
+def read_lines(path):
+    """Yield the decoded lines of a file one at a time, without line endings."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+class CachedBody:
+    """A source body spooled to disk and read back lazily."""
+
+    def __init__(self, path, sha256, size, lines):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.lines = lines
+
+    def iter_lines(self):
+        """Yield decoded lines one at a time, without line endings."""
+        return read_lines(self.path)
+
+    def text(self):
+        with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+
+
+class SourceCache:
+    """On-disk copy of each playlist source, revalidated with ETag / Last-Modified."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.fresh = {}  # url -> body fetched or revalidated by this process
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def _write(self, path, data):
+        """Write atomically so concurrent fetches of the same URL never see a partial file."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Failed to write cache file {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load_meta(self, url):
+        try:
+            with open(self._path(url, "json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def request_headers(self, url):
+        """Conditional request headers for url, empty if nothing usable is cached."""
+        if self.cached_body(url) is None:
+            return {}
+        meta = self.load_meta(url)
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def cached_body(self, url):
+        """The body stored by the last successful fetch of url, or None."""
+        meta = self.load_meta(url)
+        path = self._path(url, "body")
+        if not meta or "sha256" not in meta or not os.path.exists(path):
+            return None
+        return CachedBody(path, meta["sha256"], meta["size"], meta["lines"])
+
+    def fresh_body(self, url):
+        """The body already fetched or revalidated for url by this process, or None."""
+        return self.fresh.get(url)
+
+    def revalidated(self, url):
+        """The cached body for url after a 304, remembered as fresh for the rest of the run."""
+        body = self.cached_body(url)
+        if body is not None:
+            self.fresh[url] = body
+        return body
+
+    def spool(self, url, response):
+        """Stream a 200 response body to disk chunk by chunk, hashing it on the way."""
+        digest = hashlib.sha256()
+        size = lines = 0
+        last_byte = b"\n"
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    lines += chunk.count(b"\n")
+                    last_byte = chunk[-1:]
+            os.replace(tmp_path, self._path(url, "body"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if last_byte != b"\n":
+            lines += 1
+
+        body = CachedBody(self._path(url, "body"), digest.hexdigest(), size, lines)
+        self._write(self._path(url, "json"), json.dumps({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": body.sha256,
+            "size": body.size,
+            "lines": body.lines,
+            "fetched_at": time.time(),
+        }))
+        self.fresh[url] = body
+        return body
@@ -0,0 +1,655 @@
+"""Stream checker engine behind the BugsfreeStreams/process_streams-XX.py profiles.
+
+A profile names its output paths, its sources and mirrors, and optionally the
+group titles it keeps; everything else is shared here. Sources flow through a
+pipeline (see pipeline.Pipeline): they are fetched or read from the checkout,
+parsed, validated, picked up to MAX_STREAMS, expanded into their variants and
+written out as one playlist per channel plus a combined StreamLinks playlist.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import insort
+from datetime import datetime
+from itertools import islice
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, TimeoutError as PoolTimeout
+from urllib3.util.retry import Retry
+
+from extinf import parse_extinf
+from host_latency import LatencyHistograms
+from link_history import LinkHistory
+from output_writer import remove_stale, write_atomic, write_if_changed
+from pipeline import Pipeline, Stage
+from source_cache import SourceCache, local_path, read_lines
+from stream_probe import ALIVE, PROBE_BYTES, classify_prefix, deep_probe, read_prefix
+from variant_cache import VariantCache
+
+REPO_OWNER = "bugsfreeweb"
+REPO_NAME = "LiveTVCollector"
+BRANCH = "main"
+MAX_STREAMS = 600  # Target 500+ channels
+MAX_STREAMS_PER_SOURCE = 1000
+VALIDATION_TIMEOUT = 60  # Max 60 seconds for validation
+REVALIDATION_INTERVAL = 24 * 3600  # Revalidate every 24 hours
+DEAD_RECHECK_INTERVAL = 8 * 3600  # Wait before re-checking a dead link, doubled for each further failure in a row
+DEAD_RECHECK_MAX_INTERVAL = 7 * 24 * 3600  # Even long-dead links are re-checked weekly
+RECHECK_SLACK = 15 * 60  # Scheduled runs drift, so an interval counts as up this much early
+VALIDATION_WORKERS = 8  # Streams validated at once
+EXPANSION_WORKERS = 8  # Master playlists fetched at once
+VARIANT_PROBE_WORKERS = 16  # Variant playlists probed at once, across all masters
+HEDGE_DELAY = 2  # Seconds a source may take before its mirrors are asked too
+DEEP_PROBE = False  # Follow playlists to the first segment instead of trusting the playlist status
+DEEP_PROBE_VERDICTS = {ALIVE}  # Deep probe verdicts that count as active
+DEFAULT_LOGO = f"https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/{BRANCH}/BugsfreeLogo/default-logo.png"
+
+# Static fallback M3U
+STATIC_M3U = """
+#EXTM3U
+#EXTINF:-1 tvg-logo="https://example.com/logo.png" group-title="TEST",Sample Channel
+http://iptv-org.github.io/iptv/sample.m3u8
+"""
+
+# Fallback test stream
+FALLBACK_STREAM = {
+    "extinf": f'#EXTINF:-1 tvg-logo="{DEFAULT_LOGO}" group-title="TEST",Test Stream',
+    "url": "https://demo.unified-streaming.com/k8s/features/stable/video/tears-of-steel/tears-of-steel.ism/.m3u8",
+    "name": "test_stream"
+}
+
+
+class DeadlineExceeded(Exception):
+    """A probe timed out on a timeout cut short by the validation deadline, so nothing is known about the link."""
+
+
+def create_session(retries=3):
+    """A requests session with retries, pooled for every worker that shares it."""
+    session = requests.Session()
+    retries = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(max_retries=retries, pool_maxsize=VALIDATION_WORKERS + EXPANSION_WORKERS + VARIANT_PROBE_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def latency_key(url):
+    """Origin a URL's latency is recorded under, host:port as AsyncLinkChecker records it."""
+    parts = urlsplit(url)
+    return f"{parts.hostname}:{parts.port or (443 if parts.scheme == 'https' else 80)}"
+
+
+def is_timeout(error):
+    """Whether a requests error is a timeout, including one reported as a ConnectionError once retries ran out."""
+    reason = error.args[0].reason if error.args and isinstance(error.args[0], MaxRetryError) else None
+    return isinstance(error, requests.Timeout) or isinstance(reason, PoolTimeout)
+
+
+def timed_request(latency, host, default, request, budget=None):
+    """Call request(timeout) with host's adaptive timeout, recording how long it took or that it timed out."""
+    adaptive = latency.timeout(host, default)
+    timeout = adaptive if budget is None else min(adaptive, budget)
+    started = time.perf_counter()
+    try:
+        result = request(timeout)
+    except requests.RequestException as e:
+        if not is_timeout(e):
+            raise
+        if timeout < adaptive:
+            raise DeadlineExceeded(host) from None
+        latency.record_timeout(host, timeout)
+        raise
+    latency.record(host, time.perf_counter() - started)
+    return result
+
+
+def is_stream_active(url, session, latency, budget=None):
+    """Whether an .m3u8 URL answers like a playlist; other URLs are not checked and count as inactive.
+
+    Timeouts adapt to the host's latency histogram, falling back to 1s for
+    the HEAD and 3s for the GET until enough is known about it, and are
+    capped at budget seconds if given. Raises DeadlineExceeded if a capped
+    timeout runs out.
+    """
+    if not url.lower().endswith(".m3u8"):
+        return False
+    try:
+        host = latency_key(url)
+        if DEEP_PROBE:
+            timeout = latency.timeout(host, 3) if budget is None else min(latency.timeout(host, 3), budget)
+            return deep_probe(session, url, timeout=timeout) in DEEP_PROBE_VERDICTS
+        response = timed_request(latency, host, 1, lambda timeout: session.head(url, timeout=timeout, allow_redirects=True), budget)
+        if response.status_code in (200, 206, 301, 302):
+            return True
+        # Only the first few KB are fetched, enough to tell a playlist from an error page or a stray segment
+        status, prefix, _ = timed_request(latency, host, 3, lambda timeout: read_prefix(session, url, timeout=timeout), budget)
+        return status in (200, 206) and classify_prefix(prefix) == "hls"
+    except (requests.RequestException, ValueError):
+        return False
+
+
+def recheck_interval(failures):
+    """Seconds before a link that failed `failures` checks in a row is checked again."""
+    return min(DEAD_RECHECK_INTERVAL * 2 ** (max(failures, 1) - 1), DEAD_RECHECK_MAX_INTERVAL)
+
+
+def validation_priority(url, processed_links):
+    """Order stale links are checked in: previously active, then new, then previously dead by shortest streak."""
+    if url not in processed_links:
+        return (1, 0)
+    if processed_links[url].get("is_active", False):
+        return (0, 0)
+    return (2, processed_links[url].get("failures", 1))
+
+
+def check_stream(url, session, latency, probe_cache=None, budget=None):
+    """Check a URL at most once per run, however many checkers list it."""
+    if probe_cache is None:
+        return is_stream_active(url, session, latency, budget)
+    if url not in probe_cache:
+        probe_cache[url] = is_stream_active(url, session, latency, budget)
+    return probe_cache[url]
+
+
+def validate_entry(entry, processed_links, session, latency, probe_cache, deadline, picks, stage):
+    """Validate stage: skips links checked recently, entries past the picks cutoff and anything left once the deadline has passed."""
+    url = entry[1]
+    deadline.start()
+    if past_cutoff(entry, picks):
+        stage.tally("past limit")
+        return []
+    record = processed_links.get(url)
+    if record:
+        age = time.time() - record.get("last_checked", 0)
+        if record.get("is_active", False) and age < REVALIDATION_INTERVAL - RECHECK_SLACK:
+            logging.info(f"Skipped validation for cached active stream: {url}")
+            stage.tally("cached")
+            return [entry]
+        # Entries saved before streaks were tracked count as one failure
+        if not record.get("is_active", False) and age < recheck_interval(record.get("failures", 1)) - RECHECK_SLACK:
+            stage.tally("backing off")
+            return []
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        stage.tally("past deadline")
+        return []
+    try:
+        is_active = check_stream(url, session, latency, probe_cache, remaining)
+    except DeadlineExceeded:
+        stage.tally("past deadline")
+        return []
+    except Exception:
+        is_active = False
+    if is_active:
+        failures = 0
+    elif record and not record.get("is_active", False):
+        failures = record.get("failures", 1) + 1
+    else:
+        failures = 1
+    processed_links[url] = {
+        "last_checked": time.time(),
+        "is_active": is_active,
+        "failures": failures
+    }
+    stage.tally("active" if is_active else "dead")
+    return [entry] if is_active else []
+
+
+def parse_variants(master_url, content):
+    """Variant streams listed in a master playlist, after the master itself."""
+    variants = [{"resolution": "Original", "url": master_url, "bandwidth": 2560000}]
+    if "#EXT-X-STREAM-INF" in content:
+        lines = content.splitlines()
+        for i, line in enumerate(lines):
+            if line.startswith("#EXT-X-STREAM-INF"):
+                match = re.search(r'BANDWIDTH=(\d+).*?RESOLUTION=(\d+x\d+)', line)
+                if match:
+                    bandwidth = int(match.group(1))
+                    resolution = match.group(2)
+                    variant_url = lines[i + 1].strip() if i + 1 < len(lines) else None
+                    if variant_url and variant_url.startswith("http"):
+                        variants.append({
+                            "resolution": resolution,
+                            "url": variant_url,
+                            "bandwidth": bandwidth
+                        })
+                elif "BANDWIDTH" in line:
+                    bandwidth = int(re.search(r'BANDWIDTH=(\d+)', line).group(1))
+                    variant_url = lines[i + 1].strip() if i + 1 < len(lines) else None
+                    if variant_url and variant_url.startswith("http"):
+                        variants.append({
+                            "resolution": f"Variant_{len(variants)}",
+                            "url": variant_url,
+                            "bandwidth": bandwidth
+                        })
+    return variants
+
+
+def get_variant_streams(master_url, session, latency, variant_cache=None, probe_pool=None, probe_cache=None):
+    """A master's active variant streams, downloading the master playlist once."""
+    original = [{"resolution": "Original", "url": master_url, "bandwidth": 2560000}]
+    if not master_url.lower().endswith(".m3u8"):
+        return original
+    expanded = variant_cache.fresh(master_url) if variant_cache else None
+    if expanded is not None:
+        return expanded  # Another checker in this process already expanded it
+    try:
+        headers = variant_cache.request_headers(master_url) if variant_cache else {}
+        response = timed_request(latency, latency_key(master_url), 3,
+                                 lambda timeout: session.get(master_url, timeout=timeout, headers=headers))
+        if response.status_code == 304 and variant_cache:
+            return variant_cache.get(master_url) or original
+        if response.status_code != 200:
+            return original
+        variants = parse_variants(master_url, response.text)
+        # The master itself just loaded, so only its variants need probing
+        probes = variants[1:]
+        results = (probe_pool.map if probe_pool else map)(lambda v: check_stream(v["url"], session, latency, probe_cache), probes)
+        variants = variants[:1] + [v for v, is_active in zip(probes, results) if is_active]
+        if variant_cache:
+            variant_cache.put(master_url, response.headers, variants)
+        return variants
+    except Exception:
+        return original
+
+
+class Deadline:
+    """A time limit that starts running when start() is first called, so fetching and parsing sources does not use it up."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.ends_at = None
+
+    def start(self):
+        with self.lock:
+            if self.ends_at is None:
+                self.ends_at = time.time() + self.seconds
+
+    def remaining(self):
+        """Seconds left, counted from the first start()."""
+        return self.ends_at - time.time()
+
+
+class Picks:
+    """The entries a run keeps: the first MAX_STREAMS validated .m3u8 entries in source order, then other ones.
+
+    Entries are validated out of order, so one picked early can still be
+    pushed out by an entry earlier in its source that is validated later.
+    Once MAX_STREAMS are picked, the source index of the last one is a
+    cutoff: nothing after it can be picked any more.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.streams = []  # Sorted source indexes of picked .m3u8 entries
+        self.others = []  # Other validated entries, only used if there are too few .m3u8 ones
+
+    def cutoff(self):
+        """Source index past which no entry can be picked, or None while there is room."""
+        with self.lock:
+            return self.streams[self.limit - 1] if len(self.streams) >= self.limit else None
+
+    def add(self, entry):
+        """Record a validated .m3u8 entry, returning whether it is within the limit for now."""
+        with self.lock:
+            insort(self.streams, entry[3])
+            return len(self.streams) <= self.limit or entry[3] <= self.streams[self.limit - 1]
+
+    def add_other(self, entry):
+        """Hold a validated entry that is not an .m3u8 stream until rest()."""
+        with self.lock:
+            self.others.append(entry)
+
+    def rest(self):
+        """Once validation is done, the other entries that fill the remaining picks, in source order."""
+        with self.lock:
+            self.others.sort(key=lambda entry: entry[3])
+            del self.others[max(self.limit - len(self.streams), 0):]
+            return list(self.others)
+
+    def selected(self):
+        """Source indexes of the entries finally picked."""
+        with self.lock:
+            return set(self.streams[:self.limit]) | {entry[3] for entry in self.others}
+
+
+def past_cutoff(entry, picks):
+    """Whether enough earlier entries were already picked for this one to be left out."""
+    cutoff = picks.cutoff()
+    return cutoff is not None and entry[3] > cutoff
+
+
+def pick_entry(entry, picks, stage):
+    """Pick stage: passes validated .m3u8 entries within the limit on; the others wait for Picks.rest."""
+    if not entry[1].lower().endswith(".m3u8"):
+        stage.tally("other")
+        picks.add_other(entry)
+        return []
+    if not picks.add(entry):
+        stage.tally("past limit")
+        return []
+    stage.tally("m3u8")
+    return [entry]
+
+
+def clean_channel_name(name, url):
+    """File name for a channel, made unique by a hash of its URL."""
+    if not name:
+        return f"channel_{hashlib.md5(url.encode()).hexdigest()[:8]}"
+    name = re.sub(r'[^a-zA-Z0-9\s]', '', name).strip().lower().replace(' ', '_')
+    name = re.sub(r'_+', '_', name)
+    return f"{name}_{hashlib.md5(url.encode()).hexdigest()[:8]}" if name else f"channel_{hashlib.md5(url.encode()).hexdigest()[:8]}"
+
+
+def ensure_logo(extinf, info):
+    """Add the default logo and a last-checked timestamp to an #EXTINF line."""
+    now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S+00:00")
+    end = info.attrs_end
+    if "tvg-last-checked" not in info.attrs:
+        extinf = f'{extinf[:end]} tvg-last-checked="{now}"{extinf[end:]}'
+    if "tvg-logo" not in info.attrs:
+        extinf = f'{extinf[:end]} tvg-logo="{DEFAULT_LOGO}"{extinf[end:]}'
+    elif not info.attrs["tvg-logo"]:
+        extinf = extinf[:end].replace('tvg-logo=""', f'tvg-logo="{DEFAULT_LOGO}"', 1) + extinf[end:]
+    return extinf
+
+
+def parse_m3u(lines):
+    """Yield (extinf, url, ExtInf) entries from M3U lines as they are read, up to MAX_STREAMS_PER_SOURCE."""
+    count = 0
+    extinf = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            extinf = line
+        elif line.startswith("http") and extinf:
+            yield (extinf, line, parse_extinf(extinf))
+            extinf = None
+            count += 1
+            if count >= MAX_STREAMS_PER_SOURCE:
+                break
+
+
+def filter_by_group(entry, allowed_groups, stage):
+    """Filter stage: keeps an entry only if its group title is allowed."""
+    if entry[2].attrs.get("group-title", "") in allowed_groups:
+        stage.tally("kept")
+        return [entry]
+    stage.tally("filtered out")
+    return []
+
+
+def looks_like_playlist(path):
+    """Whether a file starts like an M3U playlist rather than an error page."""
+    with open(path, "rb") as f:
+        prefix = f.read(PROBE_BYTES)
+    return classify_prefix(prefix) == "hls" or b"#EXTINF" in prefix
+
+
+def download_source(url, session, source_cache, conditional=True):
+    """GET a source once, returning its body if it is an M3U playlist."""
+    try:
+        logging.info(f"Fetching {url}")
+        headers = source_cache.request_headers(url) if conditional else {}
+        with session.get(url, timeout=5, stream=True, headers=headers) as response:
+            if response.status_code == 304:
+                body = source_cache.cached_body(url)
+                if body is None and conditional:
+                    # The cached copy went away after the request was sent
+                    logging.warning(f"Source {url} not modified but no cached copy, fetching it again")
+                    response.close()
+                    return download_source(url, session, source_cache, conditional=False)
+                logging.info(f"Source {url} not modified, using cached copy")
+            elif response.status_code == 200:
+                body = source_cache.spool(url, response)
+            else:
+                logging.warning(f"Source {url} returned status {response.status_code}")
+                return None
+    except (requests.RequestException, OSError) as e:
+        logging.error(f"Failed to fetch {url}: {e}")
+        return None
+    if body is None or not looks_like_playlist(body.path):
+        logging.error(f"Source {url} is not an M3U playlist, skipping")
+        return None
+    return body
+
+
+def number_entries(entries, position):
+    """Add each entry's source index, (position of its source, position in the source), as a fourth item."""
+    for n, entry in enumerate(entries):
+        yield entry + ((position, n),)
+
+
+def first_seen(entries, seen):
+    """Yield only the first entry seen in this run for each URL."""
+    for entry in entries:
+        if entry[1] not in seen:
+            seen.add(entry[1])
+            yield entry
+
+
+def parse_source(source, lines, seen, position=0):
+    """Parse a source, yielding its numbered entries whose URLs are new in this run."""
+    count = 0
+    for entry in first_seen(number_entries(parse_m3u(lines), position), seen):
+        count += 1
+        yield entry
+    logging.info(f"Found {count} new entries in {source}")
+
+
+def parse_static(seen):
+    """Parse the static M3U if no source produced any entries."""
+    if seen:
+        return []
+    logging.warning("No entries from sources, using static M3U")
+    return parse_source("static M3U", STATIC_M3U.splitlines(), seen)
+
+
+class StreamChecker:
+    """One country or catalogue profile: where it reads its sources from and where it writes.
+
+    base_path is the directory of per-channel playlists (its name is also
+    where they are published under BugsfreeStreams/), final_m3u_file the
+    combined playlist. Sources may be URLs, local paths or file:// URIs;
+    fallback_sources are only read if no source can be, and source_mirrors
+    maps a URL to copies asked once it fails or is slower than HEDGE_DELAY.
+    With allowed_groups, only entries with one of those group titles are kept.
+    """
+
+    def __init__(self, base_path, final_m3u_file, processed_links_file, processed_links_db, sources,
+                 fallback_sources=(), source_mirrors=None, allowed_groups=None):
+        self.base_path = base_path
+        self.final_m3u_file = final_m3u_file
+        self.processed_links_file = processed_links_file
+        self.processed_links_db = processed_links_db
+        self.sources = list(sources)
+        self.fallback_sources = list(fallback_sources)
+        self.source_mirrors = source_mirrors or {}
+        self.allowed_groups = allowed_groups
+
+    def load_processed_links(self):
+        return LinkHistory(self.processed_links_db, json_path=self.processed_links_file)
+
+    def save_processed_links(self, processed_links):
+        try:
+            changed = processed_links.save()
+            logging.info(f"Saved {changed} changed processed links to {self.processed_links_db} ({len(processed_links)} total)")
+        except sqlite3.Error as e:
+            logging.error(f"Failed to save {self.processed_links_db}: {e}")
+
+    def fetch_remote(self, source, session, source_cache):
+        """Download a source, also asking its mirrors once it fails or takes longer than HEDGE_DELAY; the first playlist wins."""
+        mirrors = self.source_mirrors.get(source, [])
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1 + len(mirrors))
+        try:
+            urls = {executor.submit(download_source, source, session, source_cache): source}
+            pending = set(urls)
+            hedged = not mirrors
+            while pending:
+                done, pending = concurrent.futures.wait(pending, timeout=None if hedged else HEDGE_DELAY,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    if future.result() is not None:
+                        if urls[future] != source:
+                            logging.info(f"Using mirror {urls[future]} for {source}")
+                        return future.result()
+                if not hedged:
+                    logging.info(f"Source {source} {'failed' if done else f'slower than {HEDGE_DELAY}s'}, trying {', '.join(mirrors)}")
+                    for mirror in mirrors:
+                        future = executor.submit(download_source, mirror, session, source_cache)
+                        urls[future] = mirror
+                        pending.add(future)
+                    hedged = True
+            return None
+        finally:
+            # A slower duplicate request is left to finish in the background
+            executor.shutdown(wait=False)
+
+    def fetch_source(self, source, session, source_cache):
+        """Fetch stage: returns [(source, lines)], or an empty list if the source could not be read.
+
+        Local paths and file:// URIs are read straight from disk.
+        """
+        path = local_path(source)
+        if path is None:
+            body = self.fetch_remote(source, session, source_cache)
+            return [(source, body.iter_lines())] if body is not None else []
+        if not os.path.isfile(path):
+            logging.error(f"Source {path} not found, skipping")
+            return []
+        if not looks_like_playlist(path):
+            logging.error(f"Source {path} is not an M3U playlist, skipping")
+            return []
+        logging.info(f"Reading {path}")
+        return [(source, read_lines(path))]
+
+    def fetch_fallbacks(self, stage, session, source_cache):
+        """Fetch the fallback sources, but only if no primary source could be read."""
+        if stage.emitted:
+            return []
+        logging.warning("No primary source could be read, trying fallback sources")
+        return [item for source in self.fallback_sources for item in self.fetch_source(source, session, source_cache)]
+
+    def write_channel(self, extinf, channel_name, variants):
+        """Write a channel's playlist unless it is unchanged. Returns its file name, combined playlist line and whether it was written."""
+        github_url = f"https://bugsfreeweb.github.io/{REPO_NAME}/BugsfreeStreams/{os.path.basename(self.base_path)}/{channel_name}.m3u8"
+        m3u8_content = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for variant in variants:
+            resolution = variant["resolution"]
+            bandwidth = variant["bandwidth"]
+            variant_url = variant["url"]
+            m3u8_content.append(f"#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH={bandwidth},RESOLUTION={resolution}")
+            m3u8_content.append(variant_url)
+        file_name = f"{channel_name}.m3u8"
+        written = write_if_changed(os.path.join(self.base_path, file_name), "\n".join(m3u8_content))
+        return file_name, f"{extinf}\n{github_url}", written
+
+    def write_entry(self, entry, variants, stage):
+        """Write stage: one channel playlist per expanded entry."""
+        extinf, url, info, index = entry
+        channel_name = clean_channel_name(info.name, url)
+        file_name, line, written = self.write_channel(ensure_logo(extinf, info), channel_name, variants)
+        stage.tally("written" if written else "unchanged")
+        logging.info(f"Added valid stream: {channel_name} for URL {url}")
+        return [(index, file_name, line)]
+
+    def run(self, session=None, probe_session=None, source_cache=None, variant_cache=None, probe_cache=None, latency=None, entries=None):
+        """Check the profile's streams and write its playlists.
+
+        check_all_streams.py passes shared state when running several
+        checkers, and a collector running in the same process can hand over
+        its channels as entries instead of them being read from the sources.
+        """
+        logging.info("Starting stream processing")
+
+        session = session or create_session()
+        # Validation probes are never retried, so a capped timeout really bounds them by the deadline
+        probe_session = probe_session or create_session(retries=0)
+        source_cache = source_cache or SourceCache()
+        variant_cache = variant_cache or VariantCache()
+        probe_cache = {} if probe_cache is None else probe_cache  # url -> is_stream_active result for this run
+        latency = latency or LatencyHistograms()
+
+        processed_links = self.load_processed_links()
+
+        os.makedirs(self.base_path, exist_ok=True)
+        os.makedirs(os.path.dirname(self.final_m3u_file), exist_ok=True)
+
+        seen = set()
+        picks = Picks(MAX_STREAMS)
+        positions = {source: n for n, source in enumerate(self.sources + self.fallback_sources)}
+        deadline = Deadline(VALIDATION_TIMEOUT)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=VARIANT_PROBE_WORKERS) as probe_pool:
+            if entries is None:
+                fetch = Stage("fetch", lambda source: self.fetch_source(source, session, source_cache), workers=2,
+                              flush=lambda: self.fetch_fallbacks(fetch, session, source_cache))
+                parse = Stage("parse", lambda item: parse_source(*item, seen, positions[item[0]]), flush=lambda: parse_static(seen))
+                stages, items = [fetch, parse], self.sources
+            else:
+                handoff = Stage("handoff", lambda entry: first_seen([entry], seen), flush=lambda: parse_static(seen))
+                # A collector's channels are one source, capped like the sources parse_m3u reads
+                stages, items = [handoff], number_entries(islice(entries, MAX_STREAMS_PER_SOURCE), 0)
+            if self.allowed_groups is not None:
+                group = Stage("filter", lambda entry: filter_by_group(entry, self.allowed_groups, group))
+                stages.append(group)
+            # Validation takes previously active links first, then new ones, then dead ones by shortest streak,
+            # each in source order so that fewer picks are pushed out by earlier entries
+            validate = Stage("validate", lambda entry: validate_entry(entry, processed_links, probe_session, latency, probe_cache, deadline, picks, validate),
+                             workers=VALIDATION_WORKERS, queue_size=MAX_STREAMS_PER_SOURCE,
+                             priority=lambda entry: (validation_priority(entry[1], processed_links), entry[3]))
+            pick = Stage("pick", lambda entry: pick_entry(entry, picks, pick), flush=picks.rest)
+            expand = Stage("expand", lambda entry: [(entry, get_variant_streams(entry[1], session, latency, variant_cache, probe_pool, probe_cache))],
+                           workers=EXPANSION_WORKERS)
+            write = Stage("write", lambda item: self.write_entry(*item, write))
+            pipeline = Pipeline(stages + [validate, pick, expand, write])
+            written = pipeline.run(items)
+        # Entries pushed out by earlier ones validated later were written too; remove_stale deletes their files
+        selected = picks.selected()
+        channels = {file_name: line for index, file_name, line in sorted(written) if index in selected}
+        if len(picks.streams) >= MAX_STREAMS:
+            logging.info(f"Reached MAX_STREAMS limit: {MAX_STREAMS}")
+        if validate.counts["past deadline"]:
+            logging.warning(f"Validation timeout reached, {validate.counts['past deadline']} checks skipped")
+        logging.info(f"Total unique valid streams: {len(channels)}")
+
+        self.save_processed_links(processed_links)
+
+        # Add fallback if no streams
+        if not channels:
+            logging.warning("No valid streams found, adding fallback")
+            variants = get_variant_streams(FALLBACK_STREAM["url"], session, latency, variant_cache, probe_cache=probe_cache)
+            try:
+                file_name, line, _ = self.write_channel(FALLBACK_STREAM["extinf"], FALLBACK_STREAM["name"], variants)
+                channels[file_name] = line
+            except OSError as e:
+                logging.error(f"Failed to write fallback stream: {e}")
+
+        logging.info(f"Final unique streams: {len(channels)}")
+        variant_cache.save()
+        latency.save()
+
+        # Remove channels that are gone and write the combined playlist
+        try:
+            deleted = remove_stale(self.base_path, channels)
+            logging.info(f"Removed {deleted} stale files from {self.base_path}")
+        except OSError as e:
+            logging.error(f"Failed to clean up {self.base_path}: {e}")
+        now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        final_m3u_content = [f'#EXTM3U tvg-updated="{now}"'] + list(channels.values())
+        try:
+            write_atomic(self.final_m3u_file, "\n".join(final_m3u_content))
+            logging.info(f"Wrote {self.final_m3u_file} with {len(final_m3u_content)-1} entries")
+        except OSError as e:
+            logging.error(f"Failed to write {self.final_m3u_file}: {e}")
+        logging.info(f"Total files in {self.base_path}: {len(channels)}")
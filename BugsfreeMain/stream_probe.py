@@ -0,0 +1,138 @@
+import time
+from urllib.parse import urljoin
+
+import requests
+
+PROBE_BYTES = 4096  # Enough for an HLS header or a few TS packets
+PLAYLIST_BYTES = 32 * 1024  # Playlists are read further so the first variant or segment line is in range
+TS_PACKET_SIZE = 188
+MAX_PLAYLIST_DEPTH = 3  # Playlists followed before giving up on reaching a segment
+DEEP_PROBE_DEADLINE = 10  # Seconds for a whole deep probe, however many requests it takes
+
+# Deep probe verdicts
+ALIVE = "alive"  # The first media segment is reachable
+PLAYLIST_ONLY = "playlist-only"  # The playlist loads but its segments do not
+DEAD = "dead"
+
+
+def classify_prefix(prefix):
+    """Name the stream format the first bytes of a body belong to, or None if unrecognised.
+
+    Recognises HLS playlists (#EXTM3U), DASH manifests (<MPD), MPEG-TS (0x47
+    sync byte on two packets, or one whole packet), MP4/fMP4 (ftyp/styp/moof
+    box), audio (ID3 tag, ADTS, MPEG audio frame, Ogg) and the other
+    containers collectors link to directly (Matroska, FLV, AVI, ASF).
+    """
+    head = prefix.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head.startswith(b"#EXTM3U"):
+        return "hls"
+    if (head.startswith(b"<?xml") or head.startswith(b"<MPD")) and b"<MPD" in head:
+        return "dash"
+    if prefix[:1] == b"\x47" and (len(prefix) == TS_PACKET_SIZE or
+                                   (len(prefix) > TS_PACKET_SIZE and prefix[TS_PACKET_SIZE] == 0x47)):
+        return "mpegts"
+    if prefix[4:8] in (b"ftyp", b"styp", b"moof"):
+        return "mp4"
+    if prefix.startswith(b"ID3"):
+        return "id3"  # MP3 and AAC radio, and HLS packed audio segments
+    if len(prefix) > 2 and prefix[0] == 0xFF:
+        if prefix[1] & 0xF6 == 0xF0:
+            return "aac"  # ADTS header
+        if prefix[1] & 0xE0 == 0xE0 and prefix[1] & 0x06 and prefix[2] & 0xF0 != 0xF0:
+            return "mp3"  # MPEG audio frame: sync bits, a layer and a valid bitrate index
+    if prefix.startswith(b"OggS"):
+        return "ogg"
+    if prefix.startswith(b"\x1a\x45\xdf\xa3"):
+        return "mkv"
+    if prefix.startswith(b"FLV"):
+        return "flv"
+    if prefix.startswith(b"RIFF") and prefix[8:12] == b"AVI ":
+        return "avi"
+    if prefix.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"):
+        return "asf"  # ASF header object GUID, also used by WMV/WMA
+    return None
+
+
+def read_prefix(session, url, timeout, max_bytes=PROBE_BYTES):
+    """GET at most max_bytes of url with a Range header and return (status_code, prefix, final_url).
+
+    Servers that ignore Range still only get read up to max_bytes before the
+    connection is dropped.
+    """
+    headers = {"Range": f"bytes=0-{max_bytes - 1}"}
+    with session.get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=True) as response:
+        prefix = b""
+        for chunk in response.iter_content(1024):
+            prefix += chunk
+            if len(prefix) >= max_bytes:
+                break
+        return response.status_code, prefix[:max_bytes], response.url
+
+
+def next_uri(playlist, base_url, complete=True):
+    """The URI an HLS playlist points at first, as (absolute_url, is_master), or None.
+
+    For a master playlist that is its first variant, for a media playlist its
+    first segment. If the playlist was cut off, its last line is ignored.
+    """
+    lines = playlist.decode("utf-8", errors="replace").splitlines()
+    if not complete:
+        lines = lines[:-1]
+    is_master = any(line.startswith("#EXT-X-STREAM-INF") for line in lines)
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            return urljoin(base_url, line), is_master
+    return None
+
+
+def deep_probe_steps(url):
+    """Generator behind deep probes, independent of the HTTP client driving it.
+
+    Yields (url, max_bytes, verdict_so_far) for each ranged fetch to make and
+    must be sent the (status_code, prefix, final_url) it got back, final_url
+    being where redirects ended, which relative URIs are resolved against.
+    Returns the verdict once the first segment has been fetched; a driver
+    that runs out of time or hits a connection error uses verdict_so_far
+    instead.
+    """
+    status, prefix, base_url = yield url, PLAYLIST_BYTES, DEAD
+    kind = classify_prefix(prefix) if status < 400 else None
+    if kind != "hls":
+        return ALIVE if kind else DEAD  # The URL is a segment or container itself
+    encrypted = False
+    for _ in range(MAX_PLAYLIST_DEPTH):
+        encrypted = encrypted or (b"#EXT-X-KEY:" in prefix and b"METHOD=NONE" not in prefix)
+        target = next_uri(prefix, base_url, complete=len(prefix) < PLAYLIST_BYTES)
+        if target is None:
+            return PLAYLIST_ONLY
+        url, is_master = target
+        status, prefix, base_url = yield url, PLAYLIST_BYTES if is_master else PROBE_BYTES, PLAYLIST_ONLY
+        kind = classify_prefix(prefix) if status < 400 else None
+        if kind != "hls":
+            # Encrypted segments are ciphertext, so any successful body counts
+            return ALIVE if kind or (encrypted and status < 400 and prefix) else PLAYLIST_ONLY
+    return PLAYLIST_ONLY
+
+
+def deep_probe(session, url, deadline=DEEP_PROBE_DEADLINE, timeout=3):
+    """Follow url through its playlists to the first segment with requests and return ALIVE, PLAYLIST_ONLY or DEAD.
+
+    Every fetch goes through session, so its pooled connections are reused,
+    and none is started after deadline seconds.
+    """
+    steps = deep_probe_steps(url)
+    give_up_at = time.monotonic() + deadline
+    request_url, max_bytes, verdict = next(steps)
+    try:
+        while True:
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                return verdict
+            try:
+                response = read_prefix(session, request_url, min(timeout, remaining), max_bytes)
+            except requests.RequestException:
+                return verdict
+            request_url, max_bytes, verdict = steps.send(response)
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "variants.sqlite")
+MAX_AGE = 24 * 3600  # Variant lists are re-probed daily even if the master playlist is unchanged
+
+
+class VariantCache:
+    """Expanded variant lists of master playlists, keyed by master URL.
+
+    An entry is only reused after the server answers a conditional request
+    for the master with 304, using the ETag or Last-Modified stored with it,
+    and only for MAX_AGE. Masters served without validators are not cached.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=MAX_AGE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.recent = {}  # Variants expanded or revalidated by this process
+        self.hits = self.expanded = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS variants ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, variants TEXT NOT NULL, expanded_at REAL NOT NULL)"
+            )
+            self.conn.execute("DELETE FROM variants WHERE expanded_at < ?", (time.time() - max_age,))
+            self.entries = {url: (etag, last_modified, json.loads(variants)) for url, etag, last_modified, variants
+                            in self.conn.execute("SELECT url, etag, last_modified, variants FROM variants")}
+        if self.entries:
+            logging.info(f"Loaded {len(self.entries)} cached variant lists from {path}")
+
+    def request_headers(self, url):
+        """Conditional headers for fetching the master playlist at url."""
+        with self.lock:
+            entry = self.entries.get(url)
+        headers = {}
+        if entry:
+            etag, last_modified, _ = entry
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def fresh(self, url):
+        """Variants for url already expanded or revalidated by this process, or None."""
+        with self.lock:
+            return self.recent.get(url)
+
+    def get(self, url):
+        """The cached variants for url, for use after a 304, or None."""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            self.hits += 1
+            self.recent[url] = entry[2]
+            return entry[2]
+
+    def put(self, url, headers, variants):
+        """Record a fresh expansion of url, kept if the master response headers carry a validator."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        with self.lock:
+            self.expanded += 1
+            self.recent[url] = variants
+            if not etag and not last_modified:
+                return
+            self.entries[url] = (etag, last_modified, variants)
+            self.pending.append((url, etag, last_modified, json.dumps(variants), time.time()))
+
+    def save(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+            logging.info(f"Variant cache: {self.hits} unchanged master playlists reused, {self.expanded} expanded")
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO variants (url, etag, last_modified, variants, expanded_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
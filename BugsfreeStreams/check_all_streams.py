@@ -0,0 +1,150 @@
+"""Run several stream checkers in one process.
+
+Each process_streams-XX.py script is a country profile: its sources, group
+filter and output paths stay in the script, and it writes exactly where it
+would when run on its own. Run together, the checkers share the HTTP
+sessions, one source cache, one variant cache, the host latency histograms
+and a probe cache for the run, so a stream listed by several countries is
+probed and expanded once.
+
+    python BugsfreeStreams/check_all_streams.py [--collect] [BD IT VOD-WW ...]
+
+With --collect, each checker's collector (TV-Bangladesh.py for BD, the one
+writing the LiveTV/Bangladesh/LiveTV.m3u it reads) runs first in the same
+process and hands its channels straight to the checker instead of the checker
+reading them back from disk. Links the collector already checked are not
+probed again.
+"""
+import glob
+import importlib.util
+import logging
+import os
+import re
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "BugsfreeMain"))
+from host_latency import LatencyHistograms
+from source_cache import SourceCache, local_path
+from stream_checker import create_session
+from variant_cache import VariantCache
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+COLLECTOR_PREFIXES = {"LiveTV": "TV", "Movies": "Movies"}  # Output directory -> collector script prefix
+
+
+def find_profiles():
+    """Map profile names such as "BD" or "VOD-WW" to their checker scripts."""
+    profiles = {}
+    for path in glob.glob(os.path.join(SCRIPT_DIR, "process_streams*.py")):
+        match = re.fullmatch(r"process_streams[-_](.+)\.py", os.path.basename(path))
+        if match:
+            profiles[match.group(1)] = path
+    return profiles
+
+
+def load_profile(name, path):
+    """Import a checker script such as process_streams-BD.py as a module."""
+    spec = importlib.util.spec_from_file_location(f"process_streams_{name.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def collector_for(module):
+    """The collector script whose output a checker reads, such as "TV-Bangladesh", or None."""
+    for source in module.SOURCES:
+        path = local_path(source)
+        if path is None:
+            continue
+        parts = os.path.relpath(os.path.abspath(path)).split(os.sep)
+        if len(parts) == 3 and parts[0] in COLLECTOR_PREFIXES:
+            return f"{COLLECTOR_PREFIXES[parts[0]]}-{parts[1]}"
+    return None
+
+
+def seed_probe_cache(probe_cache, link_cache):
+    """Add the playlist checks made by collectors in this process to a stream checker probe cache."""
+    for url, (is_active, working_url) in link_cache.recent_results().items():
+        checked = working_url if is_active else url  # Collectors keep the URL that worked
+        if checked.lower().endswith(".m3u8"):  # The only streams the checkers probe
+            probe_cache.setdefault(checked, is_active)
+
+
+def collect(name, collector_shared, probe_cache):
+    """Run a collector and return its channels as stream checker entries, or None if it failed."""
+    from run_all import load_script
+    try:
+        collector = load_script(name).main(**collector_shared)
+    except Exception as e:
+        logging.error(f"{name} failed, checking its last output instead: {e}")
+        return None
+    seed_probe_cache(probe_cache, collector_shared["link_cache"])
+    return collector.stream_entries()
+
+
+def main():
+    args = sys.argv[1:]
+    combined = "--collect" in args
+    profiles = find_profiles()
+    names = [arg for arg in args if arg != "--collect"] or sorted(profiles)
+    unknown = [name for name in names if name not in profiles]
+    if unknown:
+        logging.error(f"No checker script for: {', '.join(unknown)}")
+        sys.exit(1)
+
+    modules = [(name, load_profile(name, profiles[name])) for name in names]
+    shared = {
+        "session": create_session(),
+        "probe_session": create_session(retries=0),
+        "source_cache": SourceCache(),
+        "variant_cache": VariantCache(),
+        "probe_cache": {},
+        "latency": LatencyHistograms(),
+    }
+    if combined:
+        # Collector dependencies are only needed in combined mode
+        from http_pool import HostPool
+        from link_cache import LinkStatusCache
+        from link_checker import AsyncLinkChecker
+        from parse_cache import ParseCache
+        collector_shared = {
+            "http_pool": HostPool(),
+            "source_cache": shared["source_cache"],
+            "parse_cache": ParseCache(),
+            "link_cache": LinkStatusCache(),
+            "link_checker": AsyncLinkChecker(latency=shared["latency"]),
+        }
+    timings = []
+    failed = []
+    start = time.perf_counter()
+    for name, module in modules:
+        started = time.perf_counter()
+        entries = None
+        collector = collector_for(module) if combined else None
+        if collector:
+            entries = collect(collector, collector_shared, shared["probe_cache"])
+        elif combined:
+            logging.warning(f"No collector writes the sources of {name}, reading them instead")
+        try:
+            module.main(entries=entries, **shared)
+        except Exception as e:
+            logging.error(f"{name} failed: {e}")
+            failed.append(name)
+        timings.append((name, time.perf_counter() - started))
+
+    if combined:
+        collector_shared["http_pool"].log_stats()
+    for name, elapsed in timings:
+        logging.info(f"{name}: {elapsed:.1f}s")
+    logging.info(f"Ran {len(names)} stream checkers in {time.perf_counter() - start:.1f}s, {len(failed)} failed, "
+                 f"{len(shared['probe_cache'])} distinct streams probed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
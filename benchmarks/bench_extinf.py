@@ -0,0 +1,65 @@
+"""Per-line cost of the #EXTINF regex chain versus the single-pass tokenizer.
+
+The regex chain is what the scripts used to run on each #EXTINF line: the
+collector's logo, group and name searches, then process_streams' group
+filter, name search and ensure_logo checks. The tokenizer parses the line
+once and every stage reads the same record.
+
+    python benchmarks/bench_extinf.py [lines]
+"""
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from extinf import parse_extinf
+
+SAMPLES = [
+    '#EXTINF:-1 tvg-id="ch{i}" tvg-name="Channel {i}" tvg-logo="https://logos.example.com/{i}.png" group-title="News",Channel {i} HD',
+    '#EXTINF:-1 tvg-id="ch{i}" group-title="Sports",Sport {i}',
+    '#EXTINF:-1 tvg-logo="" group-title="Movies, Drama",Film {i}',
+    '#EXTINF:-1,Plain {i}',
+]
+
+
+def regex_chain(line):
+    match = re.search(r'tvg-logo="([^"]*)"', line)
+    logo = match.group(1) if match and match.group(1) else None
+    match = re.search(r'group-title="([^"]*)"', line)
+    group = match.group(1) if match else "Uncategorized"
+    match = re.search(r',(.+)$', line)
+    name = match.group(1).strip() if match else ""
+    match = re.search(r'group-title="([^"]+)"', line)
+    filter_group = match.group(1) if match else ""
+    match = re.search(r',(.+)$', line)
+    channel_name = match.group(1) if match else ""
+    if 'tvg-logo="' not in line or 'tvg-logo=""' in line:
+        re.search(r'(#EXTINF:-?\d+\s+)(.*?),(.+)$', line)
+    elif 'tvg-last-checked="' not in line:
+        re.search(r'(#EXTINF:-?\d+\s+.*?)(,.*)$', line)
+    return logo, group, name, filter_group, channel_name
+
+
+def tokenizer(line):
+    info = parse_extinf(line)
+    logo = info.attrs.get("tvg-logo") or None
+    group = info.attrs.get("group-title", "Uncategorized")
+    filter_group = info.attrs.get("group-title", "")
+    "tvg-last-checked" in info.attrs
+    return logo, group, info.name, filter_group, info.name
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    lines = [SAMPLES[i % len(SAMPLES)].format(i=i) for i in range(count)]
+    print(f"{count} #EXTINF lines, best of 5")
+    for label, func in (("regex chain", regex_chain), ("tokenizer", tokenizer)):
+        elapsed = min(timeit.repeat(lambda: [func(line) for line in lines], number=1, repeat=5))
+        print(f"{label:<12} {elapsed:6.3f}s  {elapsed / count * 1e6:6.2f} us/line")
+
+
+if __name__ == "__main__":
+    main()
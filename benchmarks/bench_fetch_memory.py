@@ -0,0 +1,122 @@
+"""Peak memory of the collector fetch+parse path on a synthetic playlist.
+
+Compares the previous fetch_content (decoded line list plus a joined copy,
+then a list of parsed records) with the streaming pipeline (body spooled to
+disk, lines -> rows consumed one at a time), both ending in the collector's
+dedup/store stage. The streaming path is run twice: once parsing and
+recording rows in the parse cache, once reading them back from it. Link
+checking is left out on all sides.
+
+    python benchmarks/bench_fetch_memory.py [entries]
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from parse_cache import ParseCache
+from source_cache import SourceCache
+
+URL = "https://example.com/bench.m3u"
+
+
+def load_collector():
+    spec = importlib.util.spec_from_file_location("tv_collector", os.path.join(ROOT, "BugsfreeMain", "TV-Bangladesh.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.M3UCollector
+
+
+class FakeResponse:
+    """Just enough of requests.Response to replay a playlist file."""
+
+    headers = {"ETag": '"bench"'}
+
+    def __init__(self, path):
+        self.path = path
+
+    def iter_content(self, chunk_size):
+        with open(self.path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def iter_lines(self):
+        with open(self.path, "rb") as f:
+            for line in f:
+                yield line.rstrip(b"\r\n")
+
+
+def write_playlist(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("#EXTM3U\n")
+        for i in range(entries):
+            f.write(f'#EXTINF:-1 tvg-id="ch{i}" tvg-logo="https://logos.example.com/{i}.png" '
+                    f'group-title="Group {i % 50}",Channel {i}\n')
+            f.write(f"https://cdn{i % 20}.example.com/live/{i}/index.m3u8\n")
+
+
+def reset(collector):
+    collector.channels.clear()
+    collector.seen_urls.clear()
+
+
+def stored(collector):
+    return sum(len(channels) for channels in collector.channels.values())
+
+
+def previous_pipeline(collector, response):
+    reset(collector)
+    lines = [line.decode("utf-8", errors="ignore") for line in response.iter_lines()]
+    content = "\n".join(lines)
+    for name, logo, group, url in list(collector.parse_lines(lines)):
+        if url not in collector.seen_urls:
+            collector.seen_urls.add(url)
+            collector.channels[group].append({'name': name, 'logo': logo, 'group': group, 'source': URL, 'url': url})
+    return stored(collector), len(content)
+
+
+def streaming_pipeline(collector, response, cache_dir):
+    reset(collector)
+    body = SourceCache(cache_dir).spool(URL, response)
+    collector.parse_and_store(body, URL)
+    return stored(collector), body.size
+
+
+def measure(label, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count, size = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {count:>9} stored  {size / 1e6:8.1f} MB body  peak {peak / 1e6:8.1f} MB  {elapsed:6.1f}s")
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        playlist = os.path.join(tmp, "bench.m3u")
+        write_playlist(playlist, entries)
+        print(f"Synthetic playlist: {entries} entries, {os.path.getsize(playlist) / 1e6:.1f} MB")
+
+        cwd = os.getcwd()
+        os.chdir(tmp)  # The collector creates its output and cache directories relative to cwd
+        try:
+            collector = load_collector()(country="Bench", check_links=False)
+        finally:
+            os.chdir(cwd)
+
+        cache_dir = os.path.join(tmp, "cache")
+        collector.parse_cache = ParseCache(os.path.join(cache_dir, "parsed.sqlite"))
+        measure("previous", previous_pipeline, collector, FakeResponse(playlist))
+        measure("streaming", streaming_pipeline, collector, FakeResponse(playlist), cache_dir)
+        measure("cached", streaming_pipeline, collector, FakeResponse(playlist), cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""#EXTINF tokenizing and formatting.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from extinf import format_extinf, parse_extinf
+
+
+class ExtInfTest(unittest.TestCase):
+    def test_format_then_parse_round_trips_quoted_commas(self):
+        line, info = format_extinf("News, Live", {"tvg-logo": "http://logos.example.com/a,b.png", "group-title": "Sports, Live"})
+        self.assertEqual(line, '#EXTINF:-1 tvg-logo="http://logos.example.com/a,b.png" group-title="Sports, Live",News, Live')
+        self.assertEqual(parse_extinf(line), info)
+        self.assertEqual(line[info.attrs_end], ",")
+
+    def test_first_of_a_repeated_attribute_wins(self):
+        info = parse_extinf('#EXTINF:-1 tvg-id="a" group-title="G" tvg-id="b",Name')
+        self.assertEqual(info.attrs, {"tvg-id": "a", "group-title": "G"})
+        self.assertEqual(info.name, "Name")
+
+    def test_duration_is_kept_as_written(self):
+        self.assertEqual(parse_extinf("#EXTINF:10.5,Plain").duration, "10.5")
+        self.assertIsNone(parse_extinf('#EXTINF: tvg-id="a",Name').duration)
+
+    def test_unbalanced_quote_splits_at_the_first_comma(self):
+        info = parse_extinf('#EXTINF:-1 group-title="News,Name')
+        self.assertEqual((info.attrs, info.name), ({}, "Name"))
+
+    def test_line_without_a_name(self):
+        info = parse_extinf('#EXTINF:-1 tvg-id="a"')
+        self.assertEqual((info.attrs, info.name, info.attrs_end), ({"tvg-id": "a"}, "", len('#EXTINF:-1 tvg-id="a"')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""LinkStatusCache freshness of stored link check results.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from link_cache import ALIVE_TTL, DEAD_TTL, LinkStatusCache
+
+ALIVE = "http://example.com/alive.m3u8"
+DEAD = "http://example.com/dead.m3u8"
+
+
+class LinkStatusCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "links.sqlite")
+        cache = LinkStatusCache(self.path)
+        cache.put(ALIVE, True, "https://example.com/alive.m3u8")
+        cache.put(DEAD, False, DEAD)
+        cache.flush()
+        cache.conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def reopen(self, age):
+        """A new cache over the stored results, checked `age` seconds ago."""
+        cache = LinkStatusCache(self.path)
+        with cache.conn:
+            cache.conn.execute("UPDATE links SET checked_at = checked_at - ?", (age,))
+        self.addCleanup(cache.conn.close)
+        return cache
+
+    def test_fresh_results_are_reused_across_runs(self):
+        cache = self.reopen(0)
+        self.assertEqual(cache.get(ALIVE), (True, "https://example.com/alive.m3u8"))
+        self.assertEqual(cache.get(DEAD), (False, DEAD))
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+    def test_dead_results_expire_before_alive_ones(self):
+        cache = self.reopen(DEAD_TTL + 60)
+        self.assertEqual(cache.get(ALIVE), (True, "https://example.com/alive.m3u8"))
+        self.assertIsNone(cache.get(DEAD))
+
+    def test_alive_results_expire_too(self):
+        cache = self.reopen(ALIVE_TTL + 60)
+        self.assertIsNone(cache.get(ALIVE))
+        self.assertIsNone(cache.get(DEAD))
+
+    def test_results_of_this_run_win_over_stored_ones(self):
+        cache = self.reopen(0)
+        cache.put(ALIVE, False, ALIVE)
+        self.assertEqual(cache.get(ALIVE), (False, ALIVE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""AsyncLinkChecker against a local HTTP server.
+
+    python -m pytest tests
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from dns_cache import NegativeDnsCache
+from host_latency import BUCKETS, LatencyHistograms
+from link_checker import DEFERRED, AsyncLinkChecker
+
+# Request targets and Host headers the server accepts, as requests would send them
+EXPECTED_PATHS = {"/a%20b.m3u8", "/caf%C3%A9.m3u8", "/live/%E5%85%B5%E5%99%A8%E7%A7%91%E6%8A%80/index.m3u8"}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        host = self.headers.get("Host", "").rsplit(":", 1)[0]
+        ok = self.path in EXPECTED_PATHS and host in ("127.0.0.1", "xn--bcher-kva.example", "flaky.example")
+        self.send_response(200 if ok else 400)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """HEAD takes 1.5s to answer; GET sends its head over 0.6s and its body 0.6s later."""
+
+    def do_HEAD(self):
+        time.sleep(1.5)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        body = b"#EXTM3U\n"
+        for line in (b"HTTP/1.1 200 OK\r\n", f"Content-Length: {len(body)}\r\n".encode(), b"\r\n"):
+            self.wfile.write(line)
+            time.sleep(0.3)
+        time.sleep(0.3)
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LinkCheckerUrlTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.port = cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.checker = AsyncLinkChecker(latency=LatencyHistograms(os.path.join(self.tmp.name, "latency.sqlite")),
+                                        dns_cache=NegativeDnsCache(os.path.join(self.tmp.name, "dns.sqlite")))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check(self, url):
+        return self.checker.check_all([url], swap_protocol=False)[url][0]
+
+    def test_space_in_path_is_percent_encoded(self):
+        self.assertTrue(self.check(f"http://127.0.0.1:{self.port}/a b.m3u8"))
+
+    def test_non_ascii_path_is_percent_encoded(self):
+        self.assertTrue(self.check(f"http://127.0.0.1:{self.port}/café.m3u8"))
+        self.assertTrue(self.check(f"http://127.0.0.1:{self.port}/live/兵器科技/index.m3u8"))
+
+    def test_existing_escapes_are_kept(self):
+        self.assertTrue(self.check(f"http://127.0.0.1:{self.port}/caf%C3%A9.m3u8"))
+
+    def test_non_ascii_host_is_idna_encoded(self):
+        self.checker.addresses["bücher.example"] = ["127.0.0.1"]  # Skip the lookup, the name is not real
+        self.assertTrue(self.check(f"http://bücher.example:{self.port}/a b.m3u8"))
+
+    def test_open_circuit_defers_the_link(self):
+        origin = f"127.0.0.1:{self.port}"
+        self.checker.hosts[origin].open_until = time.monotonic() + 60
+        url = f"http://{origin}/a b.m3u8"
+        self.assertEqual(self.checker.check_all([url])[url], (DEFERRED, url))
+        self.assertEqual(self.checker.check_all([url], mode="deep")[url], (DEFERRED, url))
+        self.assertEqual(self.checker.hosts[origin].requests, 0)
+        self.assertNotIn("127.0.0.1:443", self.checker.hosts)  # No protocol swap either
+
+    def test_transient_dns_failure_is_looked_up_again(self):
+        real_getaddrinfo = socket.getaddrinfo
+        answers = [socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution"),
+                   real_getaddrinfo("127.0.0.1", None, type=socket.SOCK_STREAM)]
+
+        def getaddrinfo(host, *args, **kwargs):
+            if host != "flaky.example":
+                return real_getaddrinfo(host, *args, **kwargs)
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        url = f"http://flaky.example:{self.port}/a b.m3u8"
+        with mock.patch("socket.getaddrinfo", getaddrinfo):
+            self.assertTrue(self.check(url))  # The HEAD cannot resolve the host, the GET after it can
+        self.assertEqual(answers, [])
+        self.assertIsNone(self.checker.dns_cache.error("flaky.example"))
+
+    def test_nxdomain_is_kept(self):
+        calls = []
+
+        def getaddrinfo(host, *args, **kwargs):
+            calls.append(host)
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+        url = f"http://missing.example:{self.port}/a b.m3u8"
+        with mock.patch("socket.getaddrinfo", getaddrinfo):
+            self.assertFalse(self.check(url))
+            self.assertFalse(self.check(url))
+        self.assertEqual(calls, ["missing.example"])
+
+
+class LinkCheckerTimeoutTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+        cls.port = cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.checker = AsyncLinkChecker(latency=LatencyHistograms(os.path.join(self.tmp.name, "latency.sqlite")),
+                                        dns_cache=NegativeDnsCache(os.path.join(self.tmp.name, "dns.sqlite")))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_timeout_covers_the_whole_exchange(self):
+        url = f"http://127.0.0.1:{self.port}/slow.m3u8"
+        # Neither the head nor the body of the GET takes a second, but both together do
+        self.assertEqual(self.checker.check_all([url], timeout=1, mode="ranged")[url], (False, url))
+
+    def test_timeouts_are_recorded_above_the_timeout(self):
+        url = f"http://127.0.0.1:{self.port}/slow.m3u8"
+        self.checker.check_all([url], timeout=1, mode="ranged")
+        counts = self.checker.latency.histograms[f"127.0.0.1:{self.port}"]
+        self.assertEqual(sum(counts), 2)  # The HEAD and the GET
+        self.assertEqual(counts[BUCKETS.index(1.5)], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
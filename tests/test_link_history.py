@@ -0,0 +1,80 @@
+"""LinkHistory and the committed JSON copy of its history.
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from link_history import LinkHistory
+
+URL = "http://example.com/live.m3u8"
+
+
+class LinkHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, ".cache", "processed_links.sqlite")
+        self.json = os.path.join(self.tmp.name, "processed_links.json")
+        with open(self.json, "w", encoding="utf-8") as f:
+            json.dump({URL: {"last_checked": 100.0, "is_active": False}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self):
+        history = LinkHistory(self.db, json_path=self.json)
+        self.addCleanup(history.conn.close)
+        return history
+
+    def test_export_keeps_streaks_when_the_cache_is_lost(self):
+        history = self.open()
+        history[URL] = {"last_checked": 200.0, "is_active": False, "failures": 3}
+        history.save()
+        self.assertTrue(history.export_json(self.json))
+        with open(self.json, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)[URL]["failures"], 3)
+        history.conn.close()
+        os.remove(self.db)  # Cache evicted
+        self.assertEqual(self.open()[URL], {"last_checked": 200.0, "is_active": False, "failures": 3})
+
+    def test_save_does_not_touch_the_json(self):
+        history = self.open()
+        history[URL] = {"last_checked": 200.0, "is_active": True, "failures": 0}
+        history.save()
+        with open(self.json, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)[URL]["last_checked"], 100.0)
+
+    def test_json_already_seen_is_not_merged_again(self):
+        history = self.open()
+        history.export_json(self.json)
+        history.conn.close()
+        with mock.patch("json.loads") as loads:
+            self.open()
+        loads.assert_not_called()
+
+    def test_newer_json_entries_win_over_a_stale_database(self):
+        history = self.open()
+        history["http://example.com/other.m3u8"] = {"last_checked": 500.0, "is_active": True, "failures": 0}
+        history.save()
+        history.export_json(self.json)
+        history.conn.close()
+        # Another workflow, with its own cache, checked URL later and committed the JSON
+        with open(self.json, encoding="utf-8") as f:
+            entries = json.load(f)
+        entries[URL] = {"last_checked": 300.0, "is_active": True, "failures": 0}
+        entries["http://example.com/other.m3u8"]["last_checked"] = 400.0
+        with open(self.json, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        history = self.open()
+        self.assertTrue(history[URL]["is_active"])
+        self.assertEqual(history["http://example.com/other.m3u8"]["last_checked"], 500.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Incremental writes of the stream output directories.
+
+    python -m pytest tests
+"""
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from output_writer import remove_stale, write_if_changed
+
+
+class OutputWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_unchanged_content_is_not_rewritten(self):
+        path = self.path("a.m3u8")
+        self.assertTrue(write_if_changed(path, "#EXTM3U\nhttp://example.com/a.m3u8\n"))
+        os.utime(path, (0, 0))
+        self.assertFalse(write_if_changed(path, "#EXTM3U\nhttp://example.com/a.m3u8\n"))
+        self.assertEqual(os.stat(path).st_mtime, 0)  # Left untouched, so git sees no change
+
+    def test_changed_content_is_replaced(self):
+        path = self.path("a.m3u8")
+        write_if_changed(path, "#EXTM3U\nhttp://example.com/a.m3u8\n")
+        # Same length, different bytes
+        self.assertTrue(write_if_changed(path, "#EXTM3U\nhttp://example.com/b.m3u8\n"))
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "#EXTM3U\nhttp://example.com/b.m3u8\n")
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o644)
+        self.assertEqual(os.listdir(self.dir), ["a.m3u8"])  # No temporary files left behind
+
+    def test_remove_stale_keeps_listed_and_other_files(self):
+        for name in ("keep.m3u8", "gone.m3u8", "also_gone.m3u8", "notes.txt"):
+            write_if_changed(self.path(name), "x")
+        self.assertEqual(remove_stale(self.dir, {"keep.m3u8": "line"}), 2)
+        self.assertEqual(sorted(os.listdir(self.dir)), ["keep.m3u8", "notes.txt"])
+        self.assertEqual(remove_stale(self.dir, ["keep.m3u8"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""ParseCache chunked storage of parsed rows, and collectors reusing them for unchanged bodies.
+
+    python -m pytest tests
+"""
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from dns_cache import NegativeDnsCache
+from host_latency import LatencyHistograms
+from link_cache import LinkStatusCache
+from link_checker import AsyncLinkChecker
+from parse_cache import ParseCache
+from source_cache import CachedBody
+
+ROWS = [[f"Channel {n}", "https://logos.example.com/a,b.png", "Group \"1\"\n", f"http://example.com/{n}.m3u8"]
+        for n in range(25)]
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "parsed.sqlite")
+        self.cache = ParseCache(self.path)
+
+    def tearDown(self):
+        self.cache.conn.close()
+        self.tmp.cleanup()
+
+    def test_rows_round_trip_across_chunks(self):
+        with mock.patch("parse_cache.BATCH_ROWS", 10):
+            self.assertEqual(list(self.cache.record("hash", "parser", iter(ROWS))), ROWS)
+        self.assertEqual(self.cache.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0], 3)
+        self.assertEqual(list(self.cache.get("hash", "parser")), ROWS)
+        self.assertIsNone(self.cache.get("hash", "other parser"))
+
+    def test_unfinished_parse_is_not_cached(self):
+        with mock.patch("parse_cache.BATCH_ROWS", 10):
+            rows = self.cache.record("hash", "parser", iter(ROWS))
+            for _ in range(15):
+                next(rows)
+        rows.close()
+        self.assertIsNone(self.cache.get("hash", "parser"))
+        # Its chunks are dropped the next time the cache is opened
+        self.cache.conn.close()
+        self.cache = ParseCache(self.path)
+        self.assertEqual(self.cache.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0], 0)
+
+
+PLAYLIST = ('#EXTM3U\n#EXTINF:-1 group-title="News, Live",Channel 1\nhttp://example.com/1.m3u8\n'
+            '#EXTINF:-1 group-title="News, Live",Channel 1 again\nhttp://example.com/1.m3u8\n'
+            '#EXTINF:-1,Channel 2\nhttp://example.com/2.m3u8\n')
+
+
+def load_collector():
+    spec = importlib.util.spec_from_file_location("tv_collector", os.path.join(ROOT, "BugsfreeMain", "TV-Bangladesh.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.M3UCollector
+
+
+class CollectorParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "source.body")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(PLAYLIST)
+        data = PLAYLIST.encode("utf-8")
+        self.body = CachedBody(path, hashlib.sha256(data).hexdigest(), len(data), PLAYLIST.count("\n"))
+        cache = lambda name: os.path.join(self.tmp.name, name)
+        self.collector = load_collector()(
+            base_dir=self.tmp.name, check_links=False, parse_cache=ParseCache(cache("parsed.sqlite")),
+            link_cache=LinkStatusCache(cache("links.sqlite")),
+            link_checker=AsyncLinkChecker(latency=LatencyHistograms(cache("latency.sqlite")),
+                                          dns_cache=NegativeDnsCache(cache("dns.sqlite"))))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parse(self):
+        """parse_and_store into an empty store, returning the stored (group, name, url)."""
+        self.collector.channels.clear()
+        self.collector.seen_urls.clear()
+        self.collector.parse_and_store(self.body, "http://example.com/source.m3u")
+        return [(group, ch["name"], ch["url"]) for group, chans in self.collector.channels.items() for ch in chans]
+
+    def test_unchanged_body_is_not_parsed_again(self):
+        first = self.parse()
+        self.assertEqual(first, [("News, Live", "Channel 1", "http://example.com/1.m3u8"),
+                                 ("Uncategorized", "Channel 2", "http://example.com/2.m3u8")])
+        with mock.patch.object(self.collector, "parse_lines", side_effect=AssertionError("parsed again")):
+            self.assertEqual(self.parse(), first)
+
+    def test_changed_parser_parses_again(self):
+        self.parse()
+        self.collector.parser_id = "another parser"
+        with mock.patch.object(self.collector, "parse_lines", wraps=self.collector.parse_lines) as parse_lines:
+            self.parse()
+        parse_lines.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+"""Stream checker picks, recheck backoff, validation deadline, playlist probes and source mirrors.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from unittest import mock
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from host_latency import LatencyHistograms
+from pipeline import Stage
+from source_cache import SourceCache
+from stream_checker import (DEAD_RECHECK_INTERVAL, DEAD_RECHECK_MAX_INTERVAL, Deadline, DeadlineExceeded, Picks, StreamChecker,
+                            create_session, is_stream_active, past_cutoff, recheck_interval, validate_entry, validation_priority)
+
+
+def entry(n, suffix=".m3u8"):
+    return (f"#EXTINF:-1,Channel {n}", f"http://example.com/{n}{suffix}", None, (0, n))
+
+
+class PicksTest(unittest.TestCase):
+    def test_cutoff_follows_source_order_not_validation_order(self):
+        picks = Picks(2)
+        self.assertTrue(picks.add(entry(5)))
+        self.assertTrue(picks.add(entry(3)))
+        self.assertIsNotNone(picks.cutoff())
+        self.assertTrue(past_cutoff(entry(6), picks))
+        self.assertFalse(picks.add(entry(6)))
+        # An earlier entry validated late pushes the latest pick out
+        self.assertTrue(picks.add(entry(1)))
+        self.assertEqual(picks.selected(), {(0, 1), (0, 3)})
+        self.assertEqual(picks.rest(), [])
+
+    def test_other_entries_fill_remaining_picks_in_source_order(self):
+        picks = Picks(3)
+        picks.add(entry(4))
+        for n in (9, 2, 7):
+            picks.add_other(entry(n, ".ts"))
+        self.assertIsNone(picks.cutoff())
+        self.assertEqual([e[3] for e in picks.rest()], [(0, 2), (0, 7)])
+        self.assertEqual(picks.selected(), {(0, 4), (0, 2), (0, 7)})
+
+
+class RecheckTest(unittest.TestCase):
+    def validate(self, record):
+        """Run validate_entry on an entry whose probe result is already cached as active."""
+        e = entry(1)
+        stage = Stage("validate", None)
+        result = validate_entry(e, {e[1]: record}, None, None, {e[1]: True}, Deadline(60), Picks(10), stage)
+        return result, stage.counts
+
+    def test_backoff_doubles_per_failure_up_to_a_week(self):
+        hour = 3600
+        self.assertEqual([recheck_interval(n) for n in (0, 1, 2, 3, 4)], [8 * hour, 8 * hour, 16 * hour, 32 * hour, 64 * hour])
+        self.assertEqual(recheck_interval(5), 128 * hour)
+        self.assertEqual(recheck_interval(6), DEAD_RECHECK_MAX_INTERVAL)
+        self.assertEqual(recheck_interval(50), DEAD_RECHECK_MAX_INTERVAL)
+
+    def test_active_then_new_then_dead_by_shortest_streak(self):
+        links = {"active": {"is_active": True}, "dead1": {"is_active": False, "failures": 1},
+                 "dead4": {"is_active": False, "failures": 4}, "legacy": {"is_active": False}}
+        order = sorted(["dead4", "new", "dead1", "active", "legacy"], key=lambda url: validation_priority(url, links))
+        self.assertEqual(order, ["active", "new", "dead1", "legacy", "dead4"])
+
+    def test_dead_link_is_rechecked_by_a_run_that_starts_early(self):
+        # The 8h schedule fires a few minutes before the link is 8h old
+        record = {"is_active": False, "failures": 1, "last_checked": time.time() - DEAD_RECHECK_INTERVAL + 5 * 60}
+        result, counts = self.validate(record)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(counts["active"], 1)
+
+    def test_dead_link_backs_off_between_runs(self):
+        record = {"is_active": False, "failures": 2, "last_checked": time.time() - DEAD_RECHECK_INTERVAL}
+        result, counts = self.validate(record)
+        self.assertEqual(result, [])
+        self.assertEqual(counts["backing off"], 1)
+
+
+# Bodies served at .m3u8 paths; HEAD always fails so the ranged GET decides
+BODIES = {
+    "/playlist.m3u8": b"#EXTM3U\n#EXTINF:6,\nseg0.ts\n",
+    "/segment.m3u8": b"\x47" + b"\x00" * 187 + b"\x47" + b"\x00" * 187,
+    "/error.m3u8": b"<html>Channel offline</html>",
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        if self.path == "/slow.m3u8":
+            time.sleep(1.5)
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        body = BODIES[self.path]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IsStreamActiveTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.latency = LatencyHistograms(os.path.join(self.tmp.name, "latency.sqlite"))
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.latency.conn.close()
+        self.tmp.cleanup()
+
+    def test_playlist_url_must_serve_a_playlist(self):
+        self.assertTrue(is_stream_active(f"{self.base}/playlist.m3u8", self.session, self.latency))
+        self.assertFalse(is_stream_active(f"{self.base}/segment.m3u8", self.session, self.latency))
+        self.assertFalse(is_stream_active(f"{self.base}/error.m3u8", self.session, self.latency))
+
+    def test_budget_caps_the_probe_timeout(self):
+        started = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded), create_session(retries=0) as session:
+            is_stream_active(f"{self.base}/slow.m3u8", session, self.latency, budget=0.2)
+        self.assertLess(time.perf_counter() - started, 0.8)
+        self.assertEqual(self.latency.histograms, {})  # Nothing learnt about the host
+
+    def test_timeout_after_retries_is_recorded(self):
+        with create_session(retries=1) as session:
+            self.assertFalse(is_stream_active(f"{self.base}/slow.m3u8", session, self.latency))
+        self.assertEqual(sum(self.latency.histograms[f"127.0.0.1:{self.server.server_address[1]}"]), 1)
+
+
+class DeadlineTest(unittest.TestCase):
+    def test_deadline_runs_from_the_first_start(self):
+        deadline = Deadline(60)
+        time.sleep(0.1)
+        deadline.start()
+        first = deadline.remaining()
+        self.assertGreater(first, 59.9)
+        deadline.start()
+        self.assertLessEqual(deadline.remaining(), first)
+
+
+PLAYLIST = b"#EXTM3U\n#EXTINF:-1,Channel\nhttp://example.com/1.m3u8\n"
+
+
+class SourceHandler(BaseHTTPRequestHandler):
+    """Serves /fast-*, /slow-* (after a second) and 404s anything else, noting every path asked for."""
+
+    requested = []
+
+    def do_GET(self):
+        self.requested.append(self.path)
+        if self.path.startswith("/slow-"):
+            time.sleep(1)
+        elif not self.path.startswith("/fast-"):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PLAYLIST)))
+        self.end_headers()
+        self.wfile.write(PLAYLIST)
+
+    def log_message(self, *args):
+        pass
+
+
+class SourceMirrorsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SourceHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source_cache = SourceCache(os.path.join(self.tmp.name, "sources"))
+        self.session = requests.Session()
+        SourceHandler.requested.clear()
+        patcher = mock.patch("stream_checker.HEDGE_DELAY", 0.2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.session.close()
+        self.tmp.cleanup()
+
+    def fetch(self, source, mirrors, fallbacks=()):
+        """Read the profile's source and, if it gives nothing, its fallbacks. Returns the sources read."""
+        checker = StreamChecker(self.tmp.name, os.path.join(self.tmp.name, "all.m3u"), None, None, [source],
+                                [self.base + path for path in fallbacks], {self.base + source: [self.base + m for m in mirrors]})
+        stage = Stage("fetch", None)
+        read = checker.fetch_source(self.base + source, self.session, self.source_cache)
+        stage.emitted = len(read)
+        read += checker.fetch_fallbacks(stage, self.session, self.source_cache)
+        return [source[len(self.base):] for source, _ in read]
+
+    def test_fast_source_does_not_ask_its_mirrors(self):
+        self.assertEqual(self.fetch("/fast-a.m3u", ["/fast-mirror.m3u"]), ["/fast-a.m3u"])
+        self.assertEqual(SourceHandler.requested, ["/fast-a.m3u"])
+
+    def test_slow_source_is_hedged_with_its_mirrors(self):
+        started = time.perf_counter()
+        checker_sources = self.fetch("/slow-a.m3u", ["/fast-mirror.m3u"])
+        self.assertLess(time.perf_counter() - started, 0.9)  # The mirror answered before the source
+        self.assertEqual(checker_sources, ["/slow-a.m3u"])  # Read under the source's own name
+        self.assertEqual(SourceHandler.requested, ["/slow-a.m3u", "/fast-mirror.m3u"])
+        time.sleep(1)  # The source's own download finishes in the background; let it before its cache goes
+
+    def test_failed_source_falls_through_to_its_mirrors_then_fallbacks(self):
+        self.assertEqual(self.fetch("/missing.m3u", ["/missing-mirror.m3u"], ["/fast-fallback.m3u"]), ["/fast-fallback.m3u"])
+        self.assertEqual(SourceHandler.requested, ["/missing.m3u", "/missing-mirror.m3u", "/fast-fallback.m3u"])
+
+
+if __name__ == "__main__":
+    unittest.main()
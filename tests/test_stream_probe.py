@@ -0,0 +1,95 @@
+"""Deep probes through redirects, with both the requests and the asyncio drivers.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "BugsfreeMain"))
+
+from dns_cache import NegativeDnsCache
+from host_latency import LatencyHistograms
+from link_checker import AsyncLinkChecker
+from stream_probe import ALIVE, TS_PACKET_SIZE, classify_prefix, deep_probe
+
+# The master redirects to another directory, so its relative URIs only resolve against the final URL
+REDIRECTS = {"/old/master.m3u8": "/live/master.m3u8"}
+BODIES = {
+    "/live/master.m3u8": b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nlow/index.m3u8\n",
+    "/live/low/index.m3u8": b"#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6,\nseg0.ts\n",
+    "/live/low/seg0.ts": b"\x47" + b"\x00" * 187 + b"\x47" + b"\x00" * 187,
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in REDIRECTS:
+            self.send_response(302)
+            self.send_header("Location", REDIRECTS[self.path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = BODIES.get(self.path)
+        self.send_response(200 if body else 404)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+    def log_message(self, *args):
+        pass
+
+
+class DeepProbeRedirectTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/old/master.m3u8"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_requests_driver_resolves_against_final_url(self):
+        with requests.Session() as session:
+            self.assertEqual(deep_probe(session, self.url), ALIVE)
+
+    def test_async_driver_resolves_against_final_url(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checker = AsyncLinkChecker(latency=LatencyHistograms(os.path.join(tmp, "latency.sqlite")),
+                                       dns_cache=NegativeDnsCache(os.path.join(tmp, "dns.sqlite")))
+            self.assertEqual(checker.check_all([self.url], mode="deep")[self.url], (True, self.url))
+
+
+class ClassifyPrefixTest(unittest.TestCase):
+    def test_text_starting_with_g_is_not_mpegts(self):
+        self.assertIsNone(classify_prefix(b"Gone"))
+        self.assertIsNone(classify_prefix(b"GET / HTTP/1.1\r\n"))
+
+    def test_mpegts_needs_two_sync_bytes_or_one_whole_packet(self):
+        packet = b"\x47" + b"\x00" * (TS_PACKET_SIZE - 1)
+        self.assertEqual(classify_prefix(packet * 2), "mpegts")
+        self.assertEqual(classify_prefix(packet), "mpegts")
+        self.assertIsNone(classify_prefix(packet[:100]))
+
+    def test_radio_and_other_containers(self):
+        self.assertEqual(classify_prefix(b"\xff\xfb\x90\x64" + b"\x00" * 60), "mp3")
+        self.assertEqual(classify_prefix(b"ID3\x04\x00" + b"\x00" * 60), "id3")
+        self.assertEqual(classify_prefix(b"\xff\xf1\x50\x80" + b"\x00" * 60), "aac")
+        self.assertEqual(classify_prefix(b"OggS\x00\x02"), "ogg")
+        self.assertEqual(classify_prefix(b'<?xml version="1.0"?>\n<MPD xmlns="urn:mpeg:dash:schema:mpd:2011">'), "dash")
+        self.assertEqual(classify_prefix(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9"), "asf")
+        self.assertEqual(classify_prefix(b"\xef\xbb\xbf#EXTM3U\n"), "hls")
+        self.assertIsNone(classify_prefix(b"<!DOCTYPE html><html>Not found</html>"))
+
+
+if __name__ == "__main__":
+    unittest.main()